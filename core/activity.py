@@ -0,0 +1,116 @@
+# core/activity.py
+"""
+Per-day practice rollup (DailyActivity) behind the dashboard activity calendar.
+
+finalize_submission adds each completed attempt to the user's row for the day
+it was submitted (record_day: one F() UPDATE, or an INSERT for the first
+attempt of the day). The calendar then reads at most CALENDAR_DAYS rows through
+the (user, day) unique index, whatever the size of the user's history, and
+rebuild_streaks (core/streaks.py) reads its active days from the same rows.
+regrade_test and the `rebuild_daily_activity` command recompute users from
+their results. Days are in the current time zone, like core/streaks.py.
+
+A rebuild upserts the recomputed days and deletes only the days that are gone,
+holding the users' rows locked (SELECT ... FOR UPDATE) meanwhile.
+finalize_submission takes the same lock explicitly before record_day, so a
+submission either waits for the rebuild and adds itself on top, or is
+committed before the rebuild reads the results; it is never counted twice or
+lost.
+"""
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .answersheets import prime_sheet_counts, sheet_counts
+from .models import CustomUser, DailyActivity, TestResult
+
+CALENDAR_DAYS = 366
+
+
+def record_day(test_result):
+    """Adds a newly completed attempt (with its summary columns and completed_at filled) to its day."""
+    day = timezone.localdate(test_result.completed_at)
+    rows = DailyActivity.objects.filter(user_id=test_result.user_id, day=day)
+    changes = {
+        'tests_taken': F('tests_taken') + 1,
+        'questions_answered': F('questions_answered') + test_result.attempted_count,
+        'correct': F('correct') + test_result.correct_count,
+    }
+    if rows.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            DailyActivity.objects.create(
+                user_id=test_result.user_id, day=day, tests_taken=1,
+                questions_answered=test_result.attempted_count, correct=test_result.correct_count,
+            )
+    except IntegrityError:
+        # Another attempt of the same day got there first
+        rows.update(**changes)
+
+
+@transaction.atomic
+def rebuild_daily_activity(user_ids):
+    """Recomputes every row of `user_ids` from their completed results."""
+    # Submissions of these users wait for this lock until the rebuild commits (see module docstring);
+    # taken in id order, so two rebuilds of overlapping users can't deadlock
+    list(CustomUser.objects.select_for_update().filter(pk__in=user_ids).order_by('pk').values_list('id', flat=True))
+
+    results = TestResult.objects.filter(user_id__in=user_ids, is_completed=True).annotate(day=TruncDate('completed_at'))
+    days = {}
+
+    for row in results.filter(correct_count__isnull=False).values('user_id', 'day').annotate(
+        taken=Count('id'), answered=Sum('attempted_count'), summed_correct=Sum('correct_count'),
+    ).order_by():
+        days[row['user_id'], row['day']] = [row['taken'], row['answered'], row['summed_correct']]
+
+    # Results graded before the summary columns existed (see backfill_result_summary)
+    legacy = list(results.filter(correct_count__isnull=True))
+    for result in prime_sheet_counts(legacy):
+        counts = sheet_counts(result)
+        totals = days.setdefault((result.user_id, result.day), [0, 0, 0])
+        totals[0] += 1
+        totals[1] += counts['attempted']
+        totals[2] += counts['correct']
+
+    rows = [
+        DailyActivity(user_id=user_id, day=day, tests_taken=taken, questions_answered=answered, correct=correct)
+        for (user_id, day), (taken, answered, correct) in days.items()
+    ]
+    DailyActivity.objects.bulk_create(
+        rows, batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['user', 'day'],
+        update_fields=['tests_taken', 'questions_answered', 'correct'],
+    )
+    # Days no result falls on any more (deleted or regraded results)
+    gone = [
+        row_id
+        for row_id, user_id, day in DailyActivity.objects.filter(user_id__in=user_ids).values_list('id', 'user_id', 'day')
+        if (user_id, day) not in days
+    ]
+    DailyActivity.objects.filter(id__in=gone).delete()
+    return len(rows)
+
+
+def activity_calendar(user, today=None):
+    """Active days of the last CALENDAR_DAYS days, oldest first (days without activity are left out)."""
+    today = today or timezone.localdate()
+    start = today - timedelta(days=CALENDAR_DAYS - 1)
+    rows = DailyActivity.objects.filter(user=user, day__gte=start, day__lte=today).order_by('day')
+    return {
+        "from": start.isoformat(),
+        "to": today.isoformat(),
+        "days": [
+            {
+                "date": row.day.isoformat(),
+                "tests": row.tests_taken,
+                "questions": row.questions_answered,
+                "accuracy": round(row.correct / row.questions_answered * 100, 1) if row.questions_answered else 0,
+            }
+            for row in rows
+        ],
+    }
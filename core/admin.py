@@ -1,6 +1,6 @@
 # core/admin.py
 from django.contrib import admin
-from .models import Coupon, CustomUser, PhoneOTP,ExamName, TestSeries, Test, Section, Question, UserResponse, TestResult, TestStage
+from .models import Coupon, CustomUser, PendingSubmission, PhoneOTP,ExamName, TestSeries, Test, Section, Question, UserResponse, TestResult, TestStage
 from import_export.admin import ImportExportModelAdmin
 from .resources import QuestionResource
 from django.urls import path
@@ -146,6 +146,12 @@ admin.site.register(TestStage)
 admin.site.register(PhoneOTP)
 admin.site.register(CustomUser)
 
+@admin.register(PendingSubmission)
+class PendingSubmissionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'test_result', 'status', 'attempts', 'created_at', 'processed_at')
+    list_filter = ('status',)
+    readonly_fields = ('answers', 'error')
+
 @admin.register(Coupon)
 class CouponAdmin(admin.ModelAdmin):
     list_display = ['code', 'discount_amount', 'active', 'valid_to', 'times_used']
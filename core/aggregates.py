@@ -0,0 +1,114 @@
+# core/aggregates.py
+"""
+Series-wide and exam-wide leaderboards (AggregateScore).
+
+For every user, the best scores of the tests they took in a TestSeries (and
+in its ExamName) are summed, with the number of tests and the average.
+record_attempt() calls apply_best_change() whenever a user's best on a test
+changes, and the rows are adjusted in place with F() expressions. regrade_test
+and the `rebuild_aggregate_scores` command recompute a whole scope with one
+GROUP BY over LeaderboardEntry.
+
+scope_id is not a foreign key (it points at either table), so the database
+won't cascade. Deleting a TestSeries / ExamName removes its rows through a
+post_delete signal (core/signals.py). Rows the signal never saw (raw SQL
+deletes, rows older than the signal) are only removed by a full
+`rebuild_aggregate_scores` run (delete_orphaned_scores).
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, FloatField, Q, Sum
+from django.db.models.functions import Cast
+
+from .models import AggregateScore, ExamName, LeaderboardEntry, Test, TestSeries
+
+# Ranking orders, matching aggregate_total_idx / aggregate_average_idx
+ORDERINGS = {
+    'total': ('-total_score', 'id'),
+    'average': ('-average_score', 'id'),
+}
+
+
+def test_scopes(test_id):
+    """[('series', id), ('exam', id)] a test counts towards."""
+    series_id, exam_id = Test.objects.values_list('test_series_id', 'test_series__category_id').get(pk=test_id)
+    return [('series', series_id), ('exam', exam_id)]
+
+
+def apply_best_change(test_id, user_id, old_score, new_score):
+    """A user's best on a test went from old_score (None: first attempt) to new_score."""
+    added = 1 if old_score is None else 0
+    delta = new_score - (old_score or 0)
+    for scope, scope_id in test_scopes(test_id):
+        rows = AggregateScore.objects.filter(scope=scope, scope_id=scope_id, user_id=user_id)
+        changes = {
+            'tests_taken': F('tests_taken') + added,
+            'total_score': F('total_score') + delta,
+            # Float division, as integer-valued decimals would divide as integers on sqlite
+            'average_score': Cast(F('total_score') + delta, FloatField()) / (F('tests_taken') + added),
+        }
+        if rows.update(**changes):
+            continue
+        try:
+            with transaction.atomic():
+                AggregateScore.objects.create(
+                    scope=scope, scope_id=scope_id, user_id=user_id,
+                    tests_taken=1, total_score=new_score, average_score=new_score,
+                )
+        except IntegrityError:
+            # Created concurrently (another test of the same series); apply on top of it
+            rows.update(**changes)
+
+
+def scope_tests(scope, scope_id):
+    if scope == 'series':
+        return Test.objects.filter(test_series_id=scope_id)
+    return Test.objects.filter(test_series__category_id=scope_id)
+
+
+def rebuild_scope(scope, scope_id):
+    """Recomputes every row of one series / exam from the per-test leaderboards."""
+    rows = (
+        LeaderboardEntry.objects.filter(test__in=scope_tests(scope, scope_id))
+        .values('user_id')
+        .annotate(tests_taken=Count('id'), total_score=Sum('score'))
+        .order_by()
+    )
+    scores = [
+        AggregateScore(
+            scope=scope, scope_id=scope_id, user_id=row['user_id'], tests_taken=row['tests_taken'],
+            total_score=row['total_score'], average_score=round(row['total_score'] / row['tests_taken'], 2),
+        )
+        for row in rows
+    ]
+    with transaction.atomic():
+        AggregateScore.objects.filter(scope=scope, scope_id=scope_id).delete()
+        AggregateScore.objects.bulk_create(scores, batch_size=1000)
+    return len(scores)
+
+
+def delete_scope(scope, scope_id):
+    return AggregateScore.objects.filter(scope=scope, scope_id=scope_id).delete()[0]
+
+
+def delete_orphaned_scores():
+    """Removes rows whose series / exam no longer exists. Returns how many."""
+    series = AggregateScore.objects.filter(scope='series').exclude(scope_id__in=TestSeries.objects.values('id'))
+    exams = AggregateScore.objects.filter(scope='exam').exclude(scope_id__in=ExamName.objects.values('id'))
+    return series.delete()[0] + exams.delete()[0]
+
+
+def top_scores(scope, scope_id, order='total', limit=50):
+    return (
+        AggregateScore.objects.filter(scope=scope, scope_id=scope_id)
+        .select_related('user').order_by(*ORDERINGS[order])[:limit]
+    )
+
+
+def aggregate_rank(score, order='total'):
+    """1-based position of a row: one COUNT over the index range ahead of it.
+    The plain bound on the score ANDed in front of the OR lets the planner seek into the index."""
+    field = 'total_score' if order == 'total' else 'average_score'
+    value = getattr(score, field)
+    return AggregateScore.objects.filter(scope=score.scope, scope_id=score.scope_id).filter(
+        Q(**{f'{field}__gte': value}) & (Q(**{f'{field}__gt': value}) | Q(**{field: value, 'id__lt': score.id}))
+    ).count() + 1
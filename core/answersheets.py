@@ -0,0 +1,249 @@
+# core/answersheets.py
+"""
+Storage of submitted answer sheets.
+
+By default every question of a submission is one UserResponse row. With
+settings.RESPONSE_STORAGE = 'packed' a completed TestResult instead keeps its
+sheet in three fixed-width strings, where position i is question i of the
+result's AnswerLayout:
+
+    packed_answers   'a'-'d', or '-' when skipped
+    packed_correct   '1' when the answer was right, else '0'
+    packed_review    '1' when marked for review, else '0'
+
+The read helpers return the same shapes for both storages, so serializers, the
+dashboard and the leaderboard don't need to know which one a result uses.
+Existing rows are converted with the `pack_responses` command.
+"""
+import hashlib
+
+from django.conf import settings
+from django.db.models import Count, Q
+
+from .models import AnswerLayout, Question, UserResponse
+
+SKIPPED = '-'
+OPTIONS = 'abcd'
+
+# layout id -> tuple of question ids, and (test_id, digest) -> layout id
+_layout_questions = {}
+_layout_ids = {}
+
+
+def packed_storage_enabled():
+    return getattr(settings, 'RESPONSE_STORAGE', 'rows') == 'packed'
+
+
+def get_layout_id(test_id, question_ids):
+    """AnswerLayout for this exact question order, created on first use."""
+    joined = ','.join(map(str, question_ids))
+    digest = hashlib.sha1(joined.encode()).hexdigest()
+    layout_id = _layout_ids.get((test_id, digest))
+    if layout_id is None:
+        layout, _ = AnswerLayout.objects.get_or_create(test_id=test_id, digest=digest, defaults={'question_ids': joined})
+        layout_id = _layout_ids[(test_id, digest)] = layout.id
+        _layout_questions[layout_id] = tuple(question_ids)
+    return layout_id
+
+
+def layout_question_ids(layout_id):
+    question_ids = _layout_questions.get(layout_id)
+    if question_ids is None:
+        joined = AnswerLayout.objects.values_list('question_ids', flat=True).get(pk=layout_id)
+        question_ids = _layout_questions[layout_id] = tuple(int(q) for q in joined.split(',') if q)
+    return question_ids
+
+
+def normalize_answer(value):
+    """A client's selected_answer as one of 'abcd', or None when blank or not a valid option.
+    Packed sheets are one character per question, so anything else would shift every later position."""
+    if isinstance(value, str):
+        value = value.strip().lower()
+        if len(value) == 1 and value in OPTIONS:
+            return value
+    return None
+
+
+def pack_sheet(test_result, question_ids, selected, correct, marked):
+    """Fills the packed columns of `test_result` (not saved) from lists aligned with question_ids."""
+    test_result.layout_id = get_layout_id(test_result.test_id, question_ids)
+    test_result.packed_answers = ''.join((s or SKIPPED).lower() for s in selected)
+    test_result.packed_correct = ''.join('1' if c else '0' for c in correct)
+    test_result.packed_review = ''.join('1' if m else '0' for m in marked)
+
+
+class PackedResponse:
+    """Read-only stand-in for a UserResponse row, built from a packed sheet."""
+    __slots__ = ('id', 'test_result_id', 'question_id', 'question', 'selected_answer', 'is_correct', 'marked_for_review')
+
+    def __init__(self, test_result_id, question_id, selected_answer, is_correct, marked_for_review, question=None):
+        self.id = None
+        self.test_result_id = test_result_id
+        self.question_id = question_id
+        self.question = question
+        self.selected_answer = selected_answer
+        self.is_correct = is_correct
+        self.marked_for_review = marked_for_review
+
+
+def unpack_responses(test_result, questions=None):
+    """PackedResponse objects of a packed result, in layout order.
+    `questions` is an optional {question_id: Question} map to attach."""
+    question_ids = layout_question_ids(test_result.layout_id)
+    questions = questions or {}
+    return [
+        PackedResponse(
+            test_result.id,
+            question_id,
+            None if answer == SKIPPED else answer,
+            correct == '1',
+            review == '1',
+            questions.get(question_id),
+        )
+        for question_id, answer, correct, review in zip(
+            question_ids, test_result.packed_answers, test_result.packed_correct, test_result.packed_review
+        )
+    ]
+
+
+def get_responses(test_result, question_queryset=None):
+    """Responses of a result with their questions, whichever storage it uses."""
+    if test_result.layout_id:
+        if question_queryset is None:
+            question_queryset = Question.objects.all()
+        questions = question_queryset.in_bulk(layout_question_ids(test_result.layout_id))
+        return unpack_responses(test_result, questions)
+    if 'responses' in getattr(test_result, '_prefetched_objects_cache', {}):
+        return list(test_result.responses.all())
+    return list(test_result.responses.select_related('question'))
+
+
+def packed_counts(packed_answers, packed_correct):
+    total = len(packed_answers)
+    unanswered = packed_answers.count(SKIPPED)
+    correct = packed_correct.count('1')
+    return {
+        "total": total,
+        "correct": correct,
+        "incorrect": total - unanswered - correct,
+        "unanswered": unanswered,
+    }
+
+
+# Aggregates giving {"total", "correct", "incorrect", "unanswered"} over UserResponse rows
+ROW_COUNTS = {
+    "total": Count('id'),
+    "correct": Count('id', filter=Q(is_correct=True)),
+    "incorrect": Count('id', filter=Q(is_correct=False, selected_answer__isnull=False)),
+    "unanswered": Count('id', filter=Q(selected_answer__isnull=True)),
+}
+
+# TestResult columns written by store_summary()
+SUMMARY_FIELDS = [
+    'total_questions', 'correct_count', 'incorrect_count', 'unanswered_count', 'attempted_count', 'accuracy',
+    'section_stats',
+]
+
+
+def count_sheet(test_result):
+    """Counts a result's answer sheet from its storage, ignoring the stored summary."""
+    if test_result.layout_id:
+        return packed_counts(test_result.packed_answers, test_result.packed_correct)
+    return test_result.responses.aggregate(**ROW_COUNTS)
+
+
+def sheet_counts(test_result):
+    """{"total", "correct", "incorrect", "unanswered", "attempted"} for one result.
+    Read from the stored summary when there is one, otherwise counted.
+    Memoized on the instance, so serializer methods can share it."""
+    counts = getattr(test_result, '_sheet_counts', None)
+    if counts is not None:
+        return counts
+
+    if test_result.correct_count is not None:
+        counts = {
+            "total": test_result.total_questions,
+            "correct": test_result.correct_count,
+            "incorrect": test_result.incorrect_count,
+            "unanswered": test_result.unanswered_count,
+        }
+    else:
+        counts = count_sheet(test_result)
+    counts["attempted"] = counts["correct"] + counts["incorrect"]
+    test_result._sheet_counts = counts
+    return counts
+
+
+def prime_sheet_counts(test_results):
+    """Fills sheet_counts() for a list of results: at most one grouped query, for the
+    row-stored results that have no stored summary yet."""
+    unsummarized = [r for r in test_results if r.correct_count is None and not r.layout_id]
+    rows = UserResponse.objects.filter(test_result__in=unsummarized).values('test_result_id').annotate(**ROW_COUNTS)
+    counted = {row.pop('test_result_id'): row for row in rows.order_by()} if unsummarized else {}
+    for test_result in unsummarized:
+        counts = counted.get(test_result.id, {"total": 0, "correct": 0, "incorrect": 0, "unanswered": 0})
+        counts["attempted"] = counts["correct"] + counts["incorrect"]
+        test_result._sheet_counts = counts
+    return test_results
+
+
+def accuracy(counts, digits=2):
+    if counts["attempted"] > 0:
+        return round((counts["correct"] / counts["attempted"]) * 100, digits)
+    return 0
+
+
+def store_summary(test_result, correct, incorrect, unanswered, sections):
+    """Fills the summary columns of `test_result` (not saved).
+    `sections` is {section_id: (attempted, correct)}."""
+    test_result.total_questions = correct + incorrect + unanswered
+    test_result.correct_count = correct
+    test_result.incorrect_count = incorrect
+    test_result.unanswered_count = unanswered
+    test_result.attempted_count = correct + incorrect
+    test_result.accuracy = accuracy({"correct": correct, "attempted": correct + incorrect})
+    test_result.section_stats = {
+        str(section_id): {"attempted": section_attempted, "correct": section_correct}
+        for section_id, (section_attempted, section_correct) in sections.items()
+    }
+    test_result._sheet_counts = None
+
+
+def graded_sections(sheet):
+    """{section_id: (attempted, correct)} of a GradedSheet."""
+    return {section_id: (stats["attempted"], stats["correct"]) for section_id, stats in sheet.sections.items()}
+
+
+# Per-section aggregates over UserResponse rows, for .values(..., 'question__section_id')
+ROW_SECTION_COUNTS = {
+    "attempted": Count('id', filter=Q(selected_answer__isnull=False)),
+    "correct": Count('id', filter=Q(is_correct=True)),
+}
+
+
+def section_tally(test_result):
+    """{section_id: (attempted, correct)} for one result: the stored stats, else one
+    grouped query over its rows, else a pass over its packed sheet."""
+    if test_result.section_stats is not None:
+        return {
+            int(section_id): (stats["attempted"], stats["correct"])
+            for section_id, stats in test_result.section_stats.items()
+        }
+    if test_result.layout_id:
+        return packed_section_tally(test_result)
+    rows = test_result.responses.values('question__section_id').annotate(**ROW_SECTION_COUNTS).order_by()
+    return {row['question__section_id']: (row['attempted'], row['correct']) for row in rows}
+
+
+def packed_section_tally(test_result):
+    """{section_id: (attempted, correct)} for a packed result."""
+    question_ids = layout_question_ids(test_result.layout_id)
+    section_of = dict(Question.objects.filter(id__in=question_ids).values_list('id', 'section_id'))
+    tally = {}
+    for question_id, answer, correct in zip(question_ids, test_result.packed_answers, test_result.packed_correct):
+        if answer == SKIPPED:
+            continue
+        section_id = section_of.get(question_id)
+        attempted_so_far, correct_so_far = tally.get(section_id, (0, 0))
+        tally[section_id] = (attempted_so_far + 1, correct_so_far + (correct == '1'))
+    return tally
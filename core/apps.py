@@ -5,3 +5,6 @@ class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
 
+    def ready(self):
+        # Registers the cache invalidation receivers and the system checks
+        from . import checks, signals  # noqa: F401
@@ -0,0 +1,285 @@
+# core/autosave.py
+"""
+Saving an in-progress attempt (timer + answers) from the exam screen.
+
+Clients autosave every minute or so, so a save must cost a fixed number of
+queries no matter how many answers it carries: one lookup of the attempt,
+one UPDATE of its timer and one INSERT ... ON CONFLICT for all the answers,
+backed by the unique (test_result, question) constraint on UserResponse.
+The timer UPDATE stays a statement of its own rather than being folded into
+the upsert: its row count is what decides whether the answers may be written
+(stale seq or submitted attempt, see below). Both run in one transaction, so a save is applied whole
+or not at all.
+
+Delta protocol: a client may send only the answers that changed since its
+last save, plus `seq`, a number it increases on every save. The timer UPDATE
+only matches while the stored `autosave_seq` is lower, so a save that arrives
+after a newer one matches no row and is dropped before touching the answers.
+Saves without `seq` (older clients sending the full sheet) are always applied,
+while the attempt is open: the UPDATE also requires is_completed = False, and
+a save to a submitted attempt raises AttemptClosed without writing anything.
+
+Write-behind mode (settings.AUTOSAVE_MODE = 'buffered'): saves only update a
+per-attempt entry in the cache (settings.AUTOSAVE_CACHE, 'default' unless set)
+holding the merged timer, seq and answers, and append the attempt id to a
+dirty queue of numbered cache slots. The `flush_autosaves` command persists
+queued entries in batches. Flushing writes absolute values, so flushing an
+entry twice is harmless. Until then the paper endpoints and finalize_submission
+read through the buffer, and a submission replaces its entry with a "closed"
+marker, so saves still in flight are refused instead of re-creating it.
+
+The buffer must be visible to every web worker and to `flush_autosaves`, so
+buffered mode refuses a per-process cache (locmem, dummy) unless
+settings.AUTOSAVE_ALLOW_LOCAL_CACHE is set (tests, single-process dev).
+Each entry is read-modified-written under a per-attempt lock (cache.add), so
+concurrent saves can't overwrite each other or both pass the seq check. The
+slot counters are stored without expiry, and the "next" counter is restarted
+above the "flushed" one if it is lost anyway, so slot numbers never go back.
+"""
+import time
+from contextlib import contextmanager
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils import timezone
+
+from .answersheets import normalize_answer
+from .models import Test, TestResult, UserResponse
+
+# Largest seq the autosave_seq column (PositiveIntegerField) can hold
+MAX_SEQ = 2 ** 31 - 1
+
+
+def get_or_create_autosave_attempt(user, test_id):
+    """The user's open attempt at a test, created (with a full timer) on the first save."""
+    test_result = TestResult.objects.filter(user=user, test_id=test_id, is_completed=False).last()
+    if test_result is None:
+        test = Test.objects.get(pk=test_id)
+        test_result = TestResult.objects.create(
+            user=user, test=test, is_completed=False,
+            time_remaining=test.duration_minutes * 60, score=0,
+        )
+    return test_result
+
+
+def upsert_answers(test_result, responses):
+    """Writes [{question_id, selected_answer, marked_for_review}, ...] in one statement."""
+    # Last entry wins for a repeated question, as with one-by-one saves
+    by_question = {}
+    for resp in responses:
+        question_id = resp.get('question_id')
+        if question_id:
+            by_question[question_id] = resp
+
+    UserResponse.objects.bulk_create(
+        [
+            UserResponse(
+                test_result=test_result,
+                question_id=question_id,
+                selected_answer=normalize_answer(resp.get('selected_answer')),
+                marked_for_review=resp.get('marked_for_review', False),
+                is_correct=False,  # We don't grade yet
+            )
+            for question_id, resp in by_question.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['test_result', 'question'],
+        update_fields=['selected_answer', 'marked_for_review'],
+    )
+
+
+@transaction.atomic
+def save_progress(test_result, time_remaining, responses, seq=None):
+    """Applies one autosave. Returns False if `seq` is stale and nothing was written.
+    Raises AttemptClosed once the attempt is submitted."""
+    # Only the timer columns, instead of a full-row save(), and only while the attempt is open
+    attempt = TestResult.objects.filter(pk=test_result.pk, is_completed=False)
+    changes = {'last_updated': timezone.now()}
+    if time_remaining is not None:
+        changes['time_remaining'] = time_remaining
+    if seq is not None:
+        # Check-and-set of the sequence number, merged with the timer update
+        attempt = attempt.filter(autosave_seq__lt=seq)
+        changes['autosave_seq'] = seq
+    if not attempt.update(**changes):
+        if not TestResult.objects.filter(pk=test_result.pk, is_completed=False).exists():
+            raise AttemptClosed(test_result.pk)
+        return False
+    if responses:
+        upsert_answers(test_result, responses)
+    return True
+
+
+# --- Write-behind buffer ---
+
+BUFFER_TIMEOUT = 60 * 60 * 24  # 1 day; entries not flushed by then are lost
+DIRTY_NEXT_KEY = 'autosave:dirty:next'        # last slot number handed out
+DIRTY_FLUSHED_KEY = 'autosave:dirty:flushed'  # last slot number flushed
+CLOSED_ENTRY = {'closed': True}  # entry of a submitted attempt
+LOCK_TIMEOUT = 5   # seconds; a lock left by a crashed worker expires after this
+LOCK_WAIT = 1.0    # seconds a save waits for another save of the same attempt
+
+# Caches that each process keeps for itself (or not at all)
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+class AttemptClosed(Exception):
+    """The attempt was submitted (or removed); autosaves must not touch it any more."""
+
+
+class BufferBusy(Exception):
+    """Another save of the same attempt held its buffer entry for too long; retry later."""
+
+
+def autosave_buffered():
+    return getattr(settings, 'AUTOSAVE_MODE', 'direct') == 'buffered'
+
+
+def buffer_cache_problem():
+    """Why the configured buffer cache can't be used, or None."""
+    alias = getattr(settings, 'AUTOSAVE_CACHE', 'default')
+    backend = settings.CACHES.get(alias, {}).get('BACKEND')
+    if backend is None:
+        return f"AUTOSAVE_CACHE '{alias}' is not in CACHES."
+    if backend in LOCAL_CACHE_BACKENDS and not getattr(settings, 'AUTOSAVE_ALLOW_LOCAL_CACHE', False):
+        return (
+            f"AUTOSAVE_MODE = 'buffered' needs a cache shared by all processes (e.g. Redis), "
+            f"but AUTOSAVE_CACHE '{alias}' uses {backend}."
+        )
+    return None
+
+
+def buffer_cache():
+    problem = buffer_cache_problem()
+    if problem:
+        raise ImproperlyConfigured(problem)
+    return caches[getattr(settings, 'AUTOSAVE_CACHE', 'default')]
+
+
+@contextmanager
+def entry_lock(cache, test_result_id):
+    """Holds the attempt's buffer lock; raises BufferBusy after LOCK_WAIT seconds."""
+    key = f"autosave:lock:{test_result_id}"
+    token = uuid4().hex
+    deadline = time.monotonic() + LOCK_WAIT
+    while not cache.add(key, token, LOCK_TIMEOUT):
+        if time.monotonic() > deadline:
+            raise BufferBusy(test_result_id)
+        time.sleep(0.01)
+    try:
+        yield
+    finally:
+        # Only release our own lock, not one taken after ours expired
+        if cache.get(key) == token:
+            cache.delete(key)
+
+
+def buffer_key(test_result_id):
+    return f"autosave:{test_result_id}"
+
+
+def buffer_progress(test_result, time_remaining, responses, seq=None):
+    """Buffered counterpart of save_progress(): same stale-seq rule, no DB writes.
+    Raises AttemptClosed after a submission, BufferBusy if the entry stays locked by another save."""
+    cache = buffer_cache()
+    key = buffer_key(test_result.pk)
+    with entry_lock(cache, test_result.pk):
+        entry = cache.get(key) or {'seq': test_result.autosave_seq, 'time_remaining': None, 'answers': {}}
+        if entry.get('closed'):
+            raise AttemptClosed(test_result.pk)
+        if seq is not None:
+            if seq <= (entry['seq'] or 0):
+                return False
+            entry['seq'] = seq
+        if time_remaining is not None:
+            entry['time_remaining'] = time_remaining
+        for resp in responses:
+            question_id = resp.get('question_id')
+            if question_id:
+                entry['answers'][int(question_id)] = (
+                    normalize_answer(resp.get('selected_answer')), resp.get('marked_for_review', False)
+                )
+        cache.set(key, entry, BUFFER_TIMEOUT)
+
+    # Slot numbers only grow: a lost counter restarts above the flushed mark
+    cache.add(DIRTY_NEXT_KEY, cache.get(DIRTY_FLUSHED_KEY) or 0, None)
+    slot = cache.incr(DIRTY_NEXT_KEY)
+    cache.set(f"autosave:dirty:{slot}", test_result.pk, BUFFER_TIMEOUT)
+    return True
+
+
+def get_buffered(test_result_id):
+    """The unflushed entry of an attempt: {'seq', 'time_remaining', 'answers': {question_id: (selected, marked)}}."""
+    if not autosave_buffered():
+        return None
+    entry = buffer_cache().get(buffer_key(test_result_id))
+    if entry is None or entry.get('closed'):
+        return None
+    return entry
+
+
+def buffered_answers(entry):
+    return [
+        {'question_id': question_id, 'selected_answer': selected, 'marked_for_review': marked}
+        for question_id, (selected, marked) in entry['answers'].items()
+    ]
+
+
+def merge_buffered(saved_responses, entry):
+    """saved_responses (rows as dicts) with the buffered answers applied on top."""
+    merged = {r['question_id']: r for r in saved_responses}
+    for answer in buffered_answers(entry):
+        merged[answer['question_id']] = answer
+    return list(merged.values())
+
+
+def close_buffer(test_result_id):
+    """Replaces a submitted attempt's entry with a marker that refuses later saves."""
+    cache = buffer_cache()
+    try:
+        with entry_lock(cache, test_result_id):
+            cache.set(buffer_key(test_result_id), CLOSED_ENTRY, BUFFER_TIMEOUT)
+    except BufferBusy:
+        cache.set(buffer_key(test_result_id), CLOSED_ENTRY, BUFFER_TIMEOUT)
+
+
+def flush_buffer(batch_size=500):
+    """Persists the attempts queued since the last flush.
+    Returns (queued saves read, attempts written). Meant to run from a single `flush_autosaves` process."""
+    cache = buffer_cache()
+    first = (cache.get(DIRTY_FLUSHED_KEY) or 0) + 1
+    last = min(cache.get(DIRTY_NEXT_KEY) or 0, first + batch_size - 1)
+    if last < first:
+        return 0, 0
+
+    # A slot whose id is not written yet (save racing this flush) is skipped; the
+    # attempt's next save queues it again, and reads go through the buffer meanwhile.
+    slot_keys = [f"autosave:dirty:{slot}" for slot in range(first, last + 1)]
+    attempt_ids = set(cache.get_many(slot_keys).values())
+    entries = cache.get_many([buffer_key(attempt_id) for attempt_id in attempt_ids])
+
+    flushed = 0
+    with transaction.atomic():
+        # Row locks keep a submission from grading the attempt halfway through its flush
+        open_attempts = TestResult.objects.select_for_update().filter(id__in=attempt_ids, is_completed=False)
+        for test_result in open_attempts.only('id'):
+            entry = entries.get(buffer_key(test_result.id))
+            if entry is None or entry.get('closed'):
+                continue
+            changes = {'autosave_seq': entry['seq'] or 0, 'last_updated': timezone.now()}
+            if entry['time_remaining'] is not None:
+                changes['time_remaining'] = entry['time_remaining']
+            TestResult.objects.filter(pk=test_result.id).update(**changes)
+            if entry['answers']:
+                upsert_answers(test_result, buffered_answers(entry))
+            flushed += 1
+
+    cache.set(DIRTY_FLUSHED_KEY, last, None)
+    cache.delete_many(slot_keys)
+    return len(slot_keys), flushed
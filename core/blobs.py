@@ -0,0 +1,106 @@
+# core/blobs.py
+"""
+Pre-rendered JSON payloads with ETags and pre-compressed gzip bytes.
+
+Papers and finished results are identical on every refresh, so they are
+encoded and gzipped once and kept in the cache as a JsonBlob. Most responses
+still need a few per-user fields (saved progress, percentile), so the blob
+keeps its body without the closing brace and those fields are appended at
+response time. gzip allows the same trick: the shared part is deflated once and
+sync-flushed, only the small suffix is deflated per request, and the CRC/length
+trailer is combined from both parts.
+"""
+import hashlib
+import json
+import struct
+import zlib
+
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework.utils.encoders import JSONEncoder
+
+# Magic, deflate, no flags, no mtime, default compression, unknown OS
+GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+GZIP_LEVEL = 6
+
+
+def encode_json(data):
+    # Same output as DRF's JSONRenderer (compact, UTF-8, Decimals as numbers)
+    return json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _raw_deflater():
+    return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+
+
+class JsonBlob:
+    """A JSON object encoded once, plus its gzip form and content hash."""
+
+    def __init__(self, data):
+        body = encode_json(data)
+        self.prefix = body[:-1]  # everything but the closing "}"
+        self.has_fields = bool(data)
+        self.digest = hashlib.sha1(body).hexdigest()
+
+        deflater = _raw_deflater()
+        self.gzip_prefix = GZIP_HEADER + deflater.compress(self.prefix) + deflater.flush(zlib.Z_SYNC_FLUSH)
+        self.prefix_crc = zlib.crc32(self.prefix)
+
+    def suffix(self, extra=None):
+        if not extra:
+            return b'}'
+        fields = encode_json(extra)[1:]  # drop the opening "{"
+        return (b',' + fields) if self.has_fields else fields
+
+    def etag(self, extra=None):
+        if not extra:
+            return f'"{self.digest}"'
+        return '"%s"' % hashlib.sha1(self.digest.encode() + self.suffix(extra)).hexdigest()
+
+    def render(self, extra=None):
+        return self.prefix + self.suffix(extra)
+
+    def render_gzip(self, extra=None):
+        suffix = self.suffix(extra)
+        deflater = _raw_deflater()
+        tail = deflater.compress(suffix) + deflater.flush()
+        crc = zlib.crc32(suffix, self.prefix_crc)
+        size = (len(self.prefix) + len(suffix)) & 0xFFFFFFFF
+        return self.gzip_prefix + tail + struct.pack('<II', crc, size)
+
+
+def accepts_gzip(accept_encoding):
+    """True if an Accept-Encoding header allows gzip, honouring q-values ("gzip;q=0" refuses it)."""
+    weights = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.partition(';')
+        weight = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding.strip().lower()] = weight
+    return weights.get('gzip', weights.get('*', 0.0)) > 0
+
+
+def blob_response(request, blob, extra=None):
+    """Serves a blob (plus per-request fields) with ETag / If-None-Match and gzip support."""
+    etag = blob.etag(extra)
+    if_none_match = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    if etag in if_none_match or '*' in if_none_match:
+        response = HttpResponseNotModified()
+    else:
+        use_gzip = accepts_gzip(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        content = blob.render_gzip(extra) if use_gzip else blob.render(extra)
+        response = HttpResponse(content, content_type='application/json')
+        if use_gzip:
+            response['Content-Encoding'] = 'gzip'
+    response['ETag'] = etag
+    # Payloads carry user data, so browsers/CDNs may keep them but must revalidate
+    response['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
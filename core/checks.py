@@ -0,0 +1,13 @@
+# core/checks.py
+from django.core.checks import Error, register
+
+from .autosave import autosave_buffered, buffer_cache_problem
+
+
+@register()
+def check_autosave_cache(app_configs, **kwargs):
+    """Buffered autosaves need a cache every process shares (see core/autosave.py)."""
+    problem = autosave_buffered() and buffer_cache_problem()
+    if problem:
+        return [Error(problem, hint="Set REDIS_URL, or AUTOSAVE_MODE = 'direct'.", id='core.E001')]
+    return []
@@ -0,0 +1,187 @@
+# core/dashboard.py
+"""
+Panels of the student dashboard.
+
+Each DashboardViewSet action returns one panel. `dashboard/summary` returns all
+five in one response, built from shared reads: the user's UserStats row, their
+last TREND_LIMIT completed results (the recent table is the newest slice of the
+same list), the pending attempt and the series progress. That is four queries
+however long the history is, plus one for results without a stored summary yet.
+"""
+import time
+
+from django.db.models import Count, Q
+
+from .answersheets import accuracy, prime_sheet_counts, sheet_counts
+from .models import TestResult, TestSeries
+from .userstats import get_user_stats
+
+TREND_LIMIT = 10
+RECENT_LIMIT = 5
+
+
+def completed_results(user, limit):
+    """The user's latest completed results, newest first, with test, series and exam loaded."""
+    return prime_sheet_counts(list(
+        TestResult.objects.filter(user=user, is_completed=True)
+        .select_related('test__test_series__category')
+        .order_by('-completed_at')[:limit]
+    ))
+
+
+# 1. Performance Stats & Overall Accuracy (Top Row + Doughnut Chart)
+def stats_panel(user):
+    # Running totals kept by finalize_submission / regrade_test (see core/userstats.py)
+    stats = get_user_stats(user)
+
+    # 1. Tests Taken
+    tests_taken = stats.tests_taken
+
+    # 2. Average Score
+    avg_score = float(stats.score_sum) / tests_taken if tests_taken else 0
+
+    # 3. Aggregated Counts for Accuracy Chart
+    total_correct = stats.correct
+    total_incorrect = stats.incorrect
+    total_skipped = stats.skipped
+    questions_attempted = total_correct + total_incorrect
+
+    # Total Questions Seen (Correct + Incorrect + Skipped)
+    total_questions_seen = questions_attempted + total_skipped
+
+    # 4. Overall Accuracy Calculation
+    # Formula: (Total Correct / Total Questions Seen) * 100
+    # OR: (Total Correct / Total Attempted) * 100 ?
+    # Usually "Accuracy" implies (Correct / Attempted).
+    # "Score Percentage" implies (Correct / Total Questions).
+    # Let's stick to Accuracy (Correct / Attempted) for the stat card,
+    # but send all counts for the Pie Chart.
+
+    overall_accuracy = 0
+    if questions_attempted > 0:
+        overall_accuracy = round((total_correct / questions_attempted) * 100, 1)
+
+    return {
+        "tests_taken": tests_taken,
+        "avg_score": round(avg_score, 1),
+        "questions_attempted": questions_attempted,
+        "accuracy": overall_accuracy,
+        "total_questions": total_questions_seen,
+
+        # Extra data for Charts
+        "chart_data": {
+            "correct": total_correct,
+            "incorrect": total_incorrect,
+            "skipped": total_skipped
+        }
+    }
+
+
+# 2. Performance Trend (Line Chart), from results newest first
+def trend_panel(results):
+    data = []
+    for result in reversed(results):
+        data.append({
+            "test_title": result.test.title,
+            "score": result.score,
+            "date": result.completed_at.strftime("%b %d") # e.g. "Oct 18"
+        })
+    return data
+
+
+# 3. Resume Test
+def resume_panel(user):
+    # Find the most recently updated INCOMPLETE test
+    pending_test = (
+        TestResult.objects.filter(user=user, is_completed=False)
+        .select_related('test__test_series__category').order_by('-last_updated').first()
+    )
+    if pending_test:
+        return {
+            "id": pending_test.test.id,
+            "name": pending_test.test.title,
+            "category": pending_test.test.test_series.category.name,
+            "description": pending_test.test.test_series.description[:100] + "...", # Truncate description
+            "lastActive": pending_test.last_updated.strftime("%b %d, %I:%M %p"), # "Oct 18, 10:30 AM"
+            "progress_time": pending_test.time_remaining # You might use this to calculate % if needed
+        }
+    return "Yayy, you have no pending tests" # No pending test
+
+
+# 4. Recent Activity (Table), from results newest first
+def recent_panel(results):
+    data = []
+    for result in results:
+        # Calculate accuracy for this specific test
+        result_accuracy = accuracy(sheet_counts(result), digits=1)
+
+        data.append({
+            "id": result.id, # Result ID for navigation
+            "name": result.test.title,
+            "category": result.test.test_series.category.name,
+            "score": result.score,
+            "accuracy": result_accuracy,
+            "date": result.completed_at.strftime("%b %d, %Y")
+        })
+    return data
+
+
+# 5. My Series (Sidebar)
+def my_series_panel(user):
+    # We fetch Series + Category + Counts in a single DB hit.
+    all_series = TestSeries.objects.select_related('category').annotate(
+        # Count total tests in this series
+        total_tests_count=Count('test', distinct=True),
+
+        # Count unique tests completed by THIS user in this series
+        # We use filter=Q(...) to count only the relevant rows
+        completed_tests_count=Count(
+            'test__testresult',
+            filter=Q(test__testresult__user=user, test__testresult__is_completed=True),
+            distinct=True
+        )
+    )
+
+    data = []
+    # Pure Python Math, No DB Queries
+    for series in all_series:
+        total = series.total_tests_count
+        if total == 0: continue
+
+        completed = series.completed_tests_count
+        progress = round((completed / total) * 100)
+
+        data.append({
+            "id": series.id,
+            "name": series.name,
+            "category": series.category.name, # Already fetched via select_related
+            "progress": progress,
+            "icon": series.name[0]
+        })
+    return data
+
+
+def timed(timings, name, build, *args):
+    start = time.perf_counter()
+    value = build(*args)
+    timings[name] = time.perf_counter() - start
+    return value
+
+
+def build_summary(user):
+    """(all five panels, {step: seconds spent})."""
+    timings = {}
+    results = timed(timings, 'results', completed_results, user, TREND_LIMIT)
+    panels = {
+        'stats': timed(timings, 'stats', stats_panel, user),
+        'trend': timed(timings, 'trend', trend_panel, results),
+        'resume': timed(timings, 'resume', resume_panel, user),
+        'recent': timed(timings, 'recent', recent_panel, results[:RECENT_LIMIT]),
+        'my_series': timed(timings, 'my_series', my_series_panel, user),
+    }
+    return panels, timings
+
+
+def server_timing(timings):
+    """Server-Timing header value, e.g. "stats;dur=1.2, trend;dur=0.1"."""
+    return ', '.join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
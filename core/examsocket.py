@@ -0,0 +1,209 @@
+# core/examsocket.py
+"""
+Live exam session over a WebSocket (plain ASGI, no extra dependency).
+
+    ws(s)://<host>/ws/tests/<test_id>/session/?token=<JWT access token>
+
+One connection per attempt. The JWT is checked, and the test and attempt are
+looked up, once at connect time instead of on every autosave. The client then
+streams small JSON messages:
+
+    {"type": "answer", "question_id": 12, "selected_answer": "b", "marked_for_review": false, "seq": 41}
+    {"type": "tick", "time_remaining": 1730, "seq": 42}
+    {"type": "flush"}                      # persist now, e.g. right before submitting
+
+Changes are coalesced in memory (last answer per question, last timer value)
+and persisted at most every FLUSH_INTERVAL seconds, or after MAX_PENDING
+answers, through the same save_progress / buffer_progress as the HTTP
+autosave. The server replies {"type": "saved", "seq": n} after each write.
+The seq numbers are the delta protocol's, so the client can switch to the
+HTTP save-progress endpoint at any time. Submitting stays on HTTP; once the
+attempt is submitted, the next write is refused, the server sends
+{"type": "error", "error": "submitted"} and closes the socket with 4409.
+"""
+import asyncio
+import json
+import re
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+from .autosave import (
+    MAX_SEQ, AttemptClosed, BufferBusy, autosave_buffered, buffer_progress, get_buffered,
+    get_or_create_autosave_attempt, save_progress,
+)
+from .models import Test
+
+SESSION_PATH = re.compile(r'^/ws/tests/(?P<test_id>\d+)/session/$')
+FLUSH_INTERVAL = 10  # seconds
+MAX_PENDING = 50     # answers; flush early when a client answers very fast
+
+# Close codes (4000-4999 are free for applications)
+CLOSE_NOT_FOUND = 4404
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_FORBIDDEN = 4403
+CLOSE_BAD_MESSAGE = 4400
+CLOSE_SUBMITTED = 4409
+
+
+def database_sync_to_async(func):
+    """sync_to_async that releases stale DB connections like a request would."""
+    def wrapped(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(wrapped, thread_sensitive=True)
+
+
+def authenticate(token):
+    """User for a raw JWT access token, or None."""
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+    from rest_framework.exceptions import AuthenticationFailed
+
+    auth = JWTAuthentication()
+    try:
+        return auth.get_user(auth.get_validated_token(token))
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None
+
+
+def open_session(token, test_id):
+    """(close_code, None, None) on failure, (None, attempt, saved state) on success."""
+    user = authenticate(token) if token else None
+    if user is None:
+        return CLOSE_UNAUTHORIZED, None, None
+    test = Test.objects.filter(pk=test_id, is_published=True).first()
+    if test is None:
+        return CLOSE_NOT_FOUND, None, None
+    # Same rule as PaperAccessMixin
+    if not test.is_free and not getattr(user, 'is_pro_member', False):
+        return CLOSE_FORBIDDEN, None, None
+
+    test_result = get_or_create_autosave_attempt(user, test.id)
+    state = {'seq': test_result.autosave_seq, 'time_remaining': test_result.time_remaining}
+    buffered = get_buffered(test_result.id)
+    if buffered:
+        state['seq'] = max(buffered['seq'] or 0, state['seq'])
+        if buffered['time_remaining'] is not None:
+            state['time_remaining'] = buffered['time_remaining']
+    return None, test_result, state
+
+
+def persist(test_result, time_remaining, answers, seq):
+    save = buffer_progress if autosave_buffered() else save_progress
+    return save(test_result, time_remaining, answers, seq)
+
+
+class ExamSession:
+    def __init__(self, send, test_result):
+        self.send = send
+        self.test_result = test_result
+        self.answers = {}           # question_id -> latest answer message
+        self.time_remaining = None
+        self.seq = None             # highest seq received and not persisted yet
+
+    @property
+    def dirty(self):
+        return bool(self.answers) or self.time_remaining is not None
+
+    def apply(self, message):
+        kind = message.get('type')
+        if kind == 'answer' and message.get('question_id'):
+            self.answers[message['question_id']] = {
+                'question_id': message['question_id'],
+                'selected_answer': message.get('selected_answer'),
+                'marked_for_review': bool(message.get('marked_for_review', False)),
+            }
+        elif kind == 'tick' and message.get('time_remaining') is not None:
+            self.time_remaining = int(message['time_remaining'])
+        elif kind != 'flush':
+            raise ValueError(f"unknown message type {kind!r}")
+        if message.get('seq') is not None:
+            seq = int(message['seq'])
+            if not 0 < seq <= MAX_SEQ:
+                raise ValueError("seq out of range")
+            self.seq = max(self.seq or 0, seq)
+
+    async def flush(self, notify=True, force=False):
+        if not self.dirty:
+            if force and notify:
+                await self.send_json({'type': 'saved', 'seq': None})  # nothing pending, still ack
+            return
+        answers, time_remaining, seq = list(self.answers.values()), self.time_remaining, self.seq
+        self.answers, self.time_remaining, self.seq = {}, None, None
+        try:
+            saved = await database_sync_to_async(persist)(self.test_result, time_remaining, answers, seq)
+        except BufferBusy:
+            # Put the changes back under anything newer and retry on the next flush
+            self.answers = {**{a['question_id']: a for a in answers}, **self.answers}
+            if self.time_remaining is None:
+                self.time_remaining = time_remaining
+            if seq is not None:
+                self.seq = max(self.seq or 0, seq)
+            return
+        if notify:
+            await self.send_json({'type': 'saved' if saved else 'stale', 'seq': seq})
+
+    async def send_json(self, data):
+        await self.send({'type': 'websocket.send', 'text': json.dumps(data)})
+
+
+async def exam_session(scope, receive, send):
+    """ASGI app for the exam session socket (see module docstring)."""
+    match = SESSION_PATH.match(scope['path'])
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    if match is None:
+        await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+        return
+
+    token = parse_qs(scope.get('query_string', b'').decode()).get('token', [None])[0]
+    close_code, test_result, state = await database_sync_to_async(open_session)(token, int(match['test_id']))
+    if close_code:
+        await send({'type': 'websocket.close', 'code': close_code})
+        return
+
+    await send({'type': 'websocket.accept'})
+    session = ExamSession(send, test_result)
+    await session.send_json({'type': 'ready', 'result_id': test_result.id, **state})
+
+    loop = asyncio.get_running_loop()
+    next_flush = loop.time() + FLUSH_INTERVAL
+    try:
+        while True:
+            try:
+                message = await asyncio.wait_for(receive(), timeout=max(0, next_flush - loop.time()))
+            except asyncio.TimeoutError:
+                await session.flush()
+                next_flush = loop.time() + FLUSH_INTERVAL
+                continue
+
+            if message['type'] == 'websocket.disconnect':
+                break
+            if message['type'] != 'websocket.receive':
+                continue
+            try:
+                data = json.loads(message.get('text') or message.get('bytes') or b'')
+                session.apply(data)
+            except (ValueError, TypeError, AttributeError):
+                await send({'type': 'websocket.close', 'code': CLOSE_BAD_MESSAGE})
+                break
+
+            if data.get('type') == 'flush' or len(session.answers) >= MAX_PENDING:
+                await session.flush(force=True)
+                next_flush = loop.time() + FLUSH_INTERVAL
+    except AttemptClosed:
+        # Submitted over HTTP / the queue: nothing more may be written into the graded sheet
+        await session.send_json({'type': 'error', 'error': 'submitted'})
+        await send({'type': 'websocket.close', 'code': CLOSE_SUBMITTED})
+    finally:
+        # Whatever is still pending when the client goes away (nobody left to notify)
+        try:
+            await session.flush(notify=False)
+        except AttemptClosed:
+            pass
@@ -0,0 +1,244 @@
+# core/grading.py
+"""
+Answer keys used to grade submissions.
+
+An AnswerKey is a compact, read-only view of one version of a test: the
+question ids ordered by section, and the correct options and section ids in
+the same order. Keys are kept in a per-process dict and in the shared cache,
+both stamped with `Test.paper_version`, so grading a submission normally needs
+no question query at all. Editing a question bumps the version (core/signals.py)
+and the next submission rebuilds the key.
+"""
+from array import array
+from operator import eq
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .activity import rebuild_daily_activity
+from .aggregates import rebuild_scope, test_scopes
+from .answersheets import SUMMARY_FIELDS, graded_sections, normalize_answer, pack_sheet, store_summary, unpack_responses
+from .leaderboard import rebuild_test_leaderboard
+from .models import Question, TestResult, UserResponse
+from .signals import bump_paper_version
+from .userstats import rebuild_user_stats
+
+ANSWER_KEY_CACHE_TIMEOUT = 60 * 60 * 24  # 1 day
+
+# test_id -> AnswerKey for the latest version this process has seen
+_local_keys = {}
+
+
+class AnswerKey:
+    __slots__ = ('test_id', 'version', 'question_ids', 'options', 'section_ids', 'positions', 'section_spans')
+
+    def __init__(self, test_id, version, question_ids, options, section_ids):
+        """Questions must be ordered by (section_id, id), so every section is one contiguous span."""
+        self.test_id = test_id
+        self.version = version
+        self.question_ids = array('q', question_ids)
+        self.options = options                          # one of 'abcd' per question
+        self.section_ids = array('q', section_ids)
+        self.positions = {question_id: i for i, question_id in enumerate(question_ids)}
+        # section_id -> (start, end) slice into the aligned lists
+        self.section_spans = {}
+        for i, section_id in enumerate(section_ids):
+            start, _ = self.section_spans.get(section_id, (i, i))
+            self.section_spans[section_id] = (start, i + 1)
+
+    def __len__(self):
+        return len(self.question_ids)
+
+    def index_of(self, question_id):
+        """Position of a question in the key, or None if it is not part of this test."""
+        return self.positions.get(question_id)
+
+    def correct_option(self, question_id):
+        i = self.index_of(question_id)
+        return self.options[i] if i is not None else None
+
+
+def answer_key_cache_key(test):
+    return f"answer-key:{test.pk}:v{test.paper_version}"
+
+
+def build_answer_key(test):
+    rows = (
+        Question.objects.filter(section__test=test)
+        .order_by('section_id', 'id')
+        .values_list('id', 'correct_option', 'section_id')
+    )
+    question_ids = [row[0] for row in rows]
+    options = ''.join(row[1] for row in rows)
+    section_ids = [row[2] for row in rows]
+    return AnswerKey(test.pk, test.paper_version, question_ids, options, section_ids)
+
+
+def get_answer_key(test):
+    """Answer key for the current version of `test`: process memory, then shared cache, then DB."""
+    key = _local_keys.get(test.pk)
+    if key is not None and key.version == test.paper_version:
+        return key
+
+    key = cache.get(answer_key_cache_key(test))
+    if key is None:
+        key = build_answer_key(test)
+        cache.set(answer_key_cache_key(test), key, ANSWER_KEY_CACHE_TIMEOUT)
+    _local_keys[test.pk] = key
+    return key
+
+
+class GradedSheet:
+    """Outcome of grading one answer sheet; lists are aligned with the answer key."""
+    __slots__ = ('selected', 'marked', 'correct', 'correct_count', 'incorrect_count',
+                 'unanswered_count', 'score', 'sections')
+
+    @property
+    def attempted_count(self):
+        return self.correct_count + self.incorrect_count
+
+
+def align_answers(answer_key, answers):
+    """Turns the client's [{question_id, selected_answer, marked_for_review}, ...] into two
+    lists in answer-key order. Unknown questions are ignored; blank or invalid answers
+    (anything but one of 'abcd') become None."""
+    positions = answer_key.positions
+    selected = [None] * len(answer_key)
+    marked = [False] * len(answer_key)
+    for answer in answers:
+        question_id = answer.get('question_id')
+        i = positions.get(question_id)
+        if i is None and isinstance(question_id, str) and question_id.isdigit():
+            i = positions.get(int(question_id))
+        if i is None:
+            continue
+        selected[i] = normalize_answer(answer.get('selected_answer'))
+        marked[i] = bool(answer.get('marked_for_review', False))
+    return selected, marked
+
+
+def grade(answer_key, selected, marked, marks_correct, marks_incorrect):
+    """Grades aligned answers against the key in one pass.
+    Used by submissions and by regrades, so both always agree on the score."""
+    chosen = [s.lower() if s else None for s in selected]
+    answered = [c is not None for c in chosen]
+    correct = list(map(eq, chosen, answer_key.options))
+
+    sheet = GradedSheet()
+    sheet.selected = selected
+    sheet.marked = marked
+    sheet.correct = correct
+    sheet.correct_count = sum(correct)
+    attempted = sum(answered)
+    sheet.incorrect_count = attempted - sheet.correct_count
+    sheet.unanswered_count = len(answered) - attempted
+    sheet.score = sheet.correct_count * marks_correct - sheet.incorrect_count * marks_incorrect
+
+    # Per-section breakdown: {section_id: {"total", "attempted", "correct", "incorrect", "skipped"}}
+    sheet.sections = {}
+    for section_id, (start, end) in answer_key.section_spans.items():
+        section_attempted = sum(answered[start:end])
+        section_correct = sum(correct[start:end])
+        sheet.sections[section_id] = {
+            "total": end - start,
+            "attempted": section_attempted,
+            "correct": section_correct,
+            "incorrect": section_attempted - section_correct,
+            "skipped": end - start - section_attempted,
+        }
+    return sheet
+
+
+def regrade_test(test, chunk_size=500, on_progress=None):
+    """Re-scores every completed attempt of `test` against its current answer key and marks.
+
+    Attempts are processed in chunks of `chunk_size`. Each chunk is one read of its
+    responses, then one bulk UPDATE for the responses whose correctness flipped and
+    one for the results. Packed sheets are re-packed in place (see core/answersheets.py),
+    and the test's leaderboard is rebuilt at the end. Returns (attempts_regraded, responses_changed).
+    """
+    # Fixes made with queryset.update() skip the signals, so force a fresh key everywhere
+    bump_paper_version(pk=test.pk)
+    test.refresh_from_db(fields=['paper_version', 'marks_correct', 'marks_incorrect'])
+    answer_key = build_answer_key(test)
+
+    results = list(
+        TestResult.objects.filter(test=test, is_completed=True).order_by('id').values_list('id', 'layout_id')
+    )
+    total = len(results)
+    responses_changed = 0
+
+    for start in range(0, total, chunk_size):
+        chunk = results[start:start + chunk_size]
+        rows_by_result = {result_id: [] for result_id, layout_id in chunk if layout_id is None}
+        packed_ids = [result_id for result_id, layout_id in chunk if layout_id is not None]
+        for row in UserResponse.objects.filter(test_result_id__in=rows_by_result).values_list(
+            'id', 'test_result_id', 'question_id', 'selected_answer', 'marked_for_review', 'is_correct'
+        ):
+            rows_by_result[row[1]].append(row)
+
+        now = timezone.now()
+        results_to_update = []
+        responses_to_update = []
+        packed_to_update = []
+        for result in TestResult.objects.filter(id__in=packed_ids).only(
+            'id', 'test_id', 'layout_id', 'packed_answers', 'packed_review'
+        ):
+            # Re-aligned to the current key, so added/removed questions are handled like rows
+            answers = [
+                {'question_id': r.question_id, 'selected_answer': r.selected_answer, 'marked_for_review': r.marked_for_review}
+                for r in unpack_responses(result)
+            ]
+            selected, marked = align_answers(answer_key, answers)
+            sheet = grade(answer_key, selected, marked, test.marks_correct, test.marks_incorrect)
+            pack_sheet(result, answer_key.question_ids, sheet.selected, sheet.correct, sheet.marked)
+            result.score = sheet.score
+            result.last_updated = now
+            store_summary(result, sheet.correct_count, sheet.incorrect_count, sheet.unanswered_count, graded_sections(sheet))
+            packed_to_update.append(result)
+
+        for result_id, rows in rows_by_result.items():
+            answers = [
+                {'question_id': question_id, 'selected_answer': selected, 'marked_for_review': marked}
+                for _, _, question_id, selected, marked, _ in rows
+            ]
+            selected, marked = align_answers(answer_key, answers)
+            sheet = grade(answer_key, selected, marked, test.marks_correct, test.marks_incorrect)
+
+            for response_id, _, question_id, _, _, was_correct in rows:
+                i = answer_key.index_of(question_id)
+                is_correct = sheet.correct[i] if i is not None else False
+                if is_correct != was_correct:
+                    responses_to_update.append(UserResponse(id=response_id, is_correct=is_correct))
+
+            # last_updated moves so cached report cards are rebuilt
+            result = TestResult(id=result_id, score=sheet.score, last_updated=now)
+            store_summary(result, sheet.correct_count, sheet.incorrect_count, sheet.unanswered_count, graded_sections(sheet))
+            results_to_update.append(result)
+
+        with transaction.atomic():
+            UserResponse.objects.bulk_update(responses_to_update, ['is_correct'], batch_size=chunk_size)
+            TestResult.objects.bulk_update(
+                results_to_update, ['score', 'last_updated', *SUMMARY_FIELDS], batch_size=chunk_size
+            )
+            TestResult.objects.bulk_update(
+                packed_to_update,
+                ['layout', 'packed_answers', 'packed_correct', 'packed_review', 'score', 'last_updated', *SUMMARY_FIELDS],
+                batch_size=chunk_size,
+            )
+        responses_changed += len(responses_to_update)
+
+        if on_progress:
+            on_progress(test, min(start + chunk_size, total), total)
+
+    # Best attempts may have changed hands, and with them the series / exam totals
+    rebuild_test_leaderboard(test.pk)
+    for scope, scope_id in test_scopes(test.pk):
+        rebuild_scope(scope, scope_id)
+    # ...and so do the takers' dashboard totals and daily counts
+    user_ids = list(TestResult.objects.filter(test=test, is_completed=True).values_list('user_id', flat=True).distinct())
+    for start in range(0, len(user_ids), chunk_size):
+        rebuild_user_stats(user_ids[start:start + chunk_size])
+        rebuild_daily_activity(user_ids[start:start + chunk_size])
+    return total, responses_changed
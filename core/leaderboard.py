@@ -0,0 +1,161 @@
+# core/leaderboard.py
+"""
+Per-test leaderboards backed by LeaderboardEntry (one row per user and test).
+
+A user's entry is their best completed attempt, compared on (score,
+time_remaining). finalize_submission calls record_attempt() in the same
+transaction as the result, so the table is always current. regrade_test and
+the `rebuild_leaderboards` command rebuild a whole test from its results.
+Reading the top N is then a single range scan on leaderboard_rank_idx.
+The entries' scores also feed the percentile histograms (core/percentiles.py).
+"""
+import binascii
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q
+
+from .aggregates import apply_best_change
+from .answersheets import accuracy, sheet_counts
+from .models import LeaderboardEntry, TestResult
+from .percentiles import get_distribution, invalidate_distribution, update_distribution
+
+# Ranking order; the same columns as leaderboard_rank_idx
+RANK_ORDER = ('-score', '-time_remaining', 'id')
+
+
+def result_accuracy(test_result):
+    if test_result.accuracy is not None:
+        return test_result.accuracy
+    return accuracy(sheet_counts(test_result))
+
+
+def entry_values(test_result):
+    return {
+        'result_id': test_result.id,
+        'score': test_result.score,
+        'time_remaining': test_result.time_remaining,
+        'accuracy': result_accuracy(test_result),
+        'completed_at': test_result.completed_at,
+    }
+
+
+def record_attempt(test_result):
+    """Makes `test_result` the user's entry if it beats their current best, then updates
+    the series/exam aggregates and (after commit) the cached percentile histogram."""
+    values = entry_values(test_result)
+    entry, created = LeaderboardEntry.objects.select_for_update().get_or_create(
+        test_id=test_result.test_id, user_id=test_result.user_id, defaults=values
+    )
+    if created:
+        previous_score = None
+    elif (test_result.score, test_result.time_remaining) > (entry.score, entry.time_remaining):
+        previous_score = entry.score
+        for field, value in values.items():
+            setattr(entry, field, value)
+        entry.save()
+    else:
+        return entry
+
+    # Series / exam totals move by the same difference
+    apply_best_change(entry.test_id, entry.user_id, previous_score, entry.score)
+    transaction.on_commit(lambda: update_distribution(entry.test_id, previous_score, entry.score))
+    return entry
+
+
+def top_entries(test_id, limit=50):
+    return LeaderboardEntry.objects.filter(test_id=test_id).select_related('user').order_by(*RANK_ORDER)[:limit]
+
+
+# Keyset navigation: an entry's position is its (score, time_remaining, id) key.
+# "Ahead" and "behind" are index range conditions, so deep pages cost the same as the first.
+# The plain score bound ANDed in front of the OR is what lets the planner seek into
+# leaderboard_rank_idx; the OR alone is only applied as a filter over every row of the test.
+
+def ahead_of(score, time_remaining, entry_id):
+    return Q(score__gte=score) & (
+        Q(score__gt=score)
+        | Q(score=score, time_remaining__gt=time_remaining)
+        | Q(score=score, time_remaining=time_remaining, id__lt=entry_id)
+    )
+
+
+def behind(score, time_remaining, entry_id):
+    return Q(score__lte=score) & (
+        Q(score__lt=score)
+        | Q(score=score, time_remaining__lt=time_remaining)
+        | Q(score=score, time_remaining=time_remaining, id__gt=entry_id)
+    )
+
+
+def rank_of(entry, histogram=None, counts=None):
+    """1-based position of an entry. Users in higher score buckets are summed from the cached
+    histogram (core/percentiles.py); only the entries ahead of it in its own bucket are counted,
+    over their index range. Equal scores share a bucket, so the order among ties is exact.
+    Pass the histogram and its counts when the caller has already read them."""
+    if histogram is None:
+        histogram = get_distribution(entry.test_id)
+    if counts is None:
+        counts = histogram.counts()
+    bucket = histogram.bucket_of(entry.score)
+    same_bucket = LeaderboardEntry.objects.filter(test_id=entry.test_id).filter(
+        ahead_of(entry.score, entry.time_remaining, entry.id)
+    )
+    upper = histogram.upper_bound(bucket)
+    if upper is not None:
+        same_bucket = same_bucket.filter(score__lt=upper)
+    return sum(counts[bucket + 1:]) + same_bucket.count() + 1
+
+
+def entries_after(test_id, key, limit):
+    """Up to `limit` entries following `key` (score, time_remaining, id) in ranking order; None = from the top."""
+    entries = LeaderboardEntry.objects.filter(test_id=test_id).select_related('user')
+    if key is not None:
+        entries = entries.filter(behind(*key))
+    return list(entries.order_by(*RANK_ORDER)[:limit])
+
+
+def entries_before(test_id, key, limit):
+    """Up to `limit` entries right before `key`, in ranking order."""
+    entries = LeaderboardEntry.objects.filter(test_id=test_id).select_related('user').filter(ahead_of(*key))
+    return list(entries.order_by('score', 'time_remaining', '-id')[:limit])[::-1]
+
+
+def encode_cursor(entry, rank):
+    raw = f"{entry.score}:{entry.time_remaining}:{entry.id}:{rank}"
+    return urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """((score, time_remaining, id), rank) of the last row of the previous page. Raises ValueError."""
+    try:
+        score, time_remaining, entry_id, rank = urlsafe_b64decode(cursor.encode()).decode().split(':')
+        return (Decimal(score), int(time_remaining), int(entry_id)), int(rank)
+    except (TypeError, UnicodeDecodeError, binascii.Error, ArithmeticError) as exc:
+        raise ValueError("invalid cursor") from exc
+
+
+def rebuild_test_leaderboard(test_id):
+    """Recomputes every entry of a test from its completed results. Returns the entry count."""
+    best = {}
+    for result in (
+        TestResult.objects.filter(test_id=test_id, is_completed=True)
+        .order_by('user_id', '-score', '-time_remaining', 'id')
+        .only('id', 'test_id', 'user_id', 'score', 'time_remaining', 'completed_at', 'accuracy', 'layout_id',
+              'packed_answers', 'packed_correct', 'correct_count', 'incorrect_count', 'unanswered_count',
+              'total_questions')
+        .iterator(chunk_size=2000)
+    ):
+        if result.user_id not in best:
+            best[result.user_id] = result
+
+    entries = [
+        LeaderboardEntry(test_id=test_id, user_id=user_id, **entry_values(result))
+        for user_id, result in best.items()
+    ]
+    with transaction.atomic():
+        LeaderboardEntry.objects.filter(test_id=test_id).delete()
+        LeaderboardEntry.objects.bulk_create(entries, batch_size=1000)
+    invalidate_distribution(test_id)
+    return len(entries)
@@ -0,0 +1,55 @@
+# core/management/commands/backfill_result_summary.py
+
+from django.core.management.base import BaseCommand
+from core.answersheets import (
+    ROW_COUNTS, ROW_SECTION_COUNTS, SUMMARY_FIELDS, packed_counts, packed_section_tally, store_summary,
+)
+from core.models import TestResult, UserResponse
+
+
+class Command(BaseCommand):
+    help = 'Fills the summary columns (counts, accuracy, per-section stats) of completed results graded before they existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Results per bulk update')
+        parser.add_argument('--all', action='store_true', help='Recompute results that already have a summary too')
+
+    def handle(self, *args, **options):
+        results = TestResult.objects.filter(is_completed=True)
+        if not options['all']:
+            results = results.filter(correct_count__isnull=True)
+        result_ids = list(results.order_by('id').values_list('id', flat=True))
+        chunk_size = options['chunk_size']
+        self.stdout.write(f"Summarizing {len(result_ids)} result(s)...")
+
+        for start in range(0, len(result_ids), chunk_size):
+            chunk = result_ids[start:start + chunk_size]
+            # One grouped query for every row-based result of the chunk
+            row_counts = {
+                row['test_result_id']: row
+                for row in UserResponse.objects.filter(test_result_id__in=chunk)
+                .values('test_result_id').annotate(**ROW_COUNTS)
+            }
+            section_counts = {}
+            for row in UserResponse.objects.filter(test_result_id__in=chunk).values(
+                'test_result_id', 'question__section_id'
+            ).annotate(**ROW_SECTION_COUNTS).order_by():
+                section_counts.setdefault(row['test_result_id'], {})[row['question__section_id']] = (
+                    row['attempted'], row['correct']
+                )
+
+            to_update = []
+            for result in TestResult.objects.filter(id__in=chunk).only('id', 'layout_id', 'packed_answers', 'packed_correct'):
+                if result.layout_id:
+                    counts = packed_counts(result.packed_answers, result.packed_correct)
+                    sections = packed_section_tally(result)
+                else:
+                    counts = row_counts.get(result.id, {"correct": 0, "incorrect": 0, "unanswered": 0})
+                    sections = section_counts.get(result.id, {})
+                store_summary(result, counts["correct"], counts["incorrect"], counts["unanswered"], sections)
+                to_update.append(result)
+
+            TestResult.objects.bulk_update(to_update, SUMMARY_FIELDS, batch_size=chunk_size)
+            self.stdout.write(f"  {start + len(chunk)}/{len(result_ids)}")
+
+        self.stdout.write(self.style.SUCCESS(f"\nTask Complete. Summarized {len(result_ids)} results."))
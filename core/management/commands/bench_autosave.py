@@ -0,0 +1,100 @@
+# core/management/commands/bench_autosave.py
+
+import random
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from core.autosave import get_or_create_autosave_attempt, save_progress
+from core.models import CustomUser, ExamName, Question, Section, Test, TestResult, TestSeries, UserResponse
+
+
+def legacy_save(user, test_id, time_remaining, responses):
+    """What SaveTestProgressView did before core.autosave (kept for comparison)."""
+    test = Test.objects.get(pk=test_id)
+    test_result, created = TestResult.objects.get_or_create(
+        user=user,
+        test=test,
+        is_completed=False,
+        defaults={'time_remaining': test.duration_minutes * 60, 'score': 0.0}
+    )
+    if time_remaining is not None:
+        test_result.time_remaining = time_remaining
+        test_result.save()
+    for resp in responses:
+        if resp.get('question_id'):
+            UserResponse.objects.update_or_create(
+                test_result=test_result,
+                question_id=resp['question_id'],
+                defaults={
+                    'selected_answer': resp.get('selected_answer'),
+                    'marked_for_review': resp.get('marked_for_review', False),
+                    'is_correct': False
+                }
+            )
+
+
+def bulk_save(user, test_id, time_remaining, responses):
+    save_progress(get_or_create_autosave_attempt(user, test_id), time_remaining, responses)
+
+
+class Rollback(Exception):
+    pass
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark: queries and latency per autosave, legacy update_or_create loop vs bulk upsert. Writes nothing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10,50,100', help='Comma separated answers per save')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'answers':>8} {'path':>8} {'queries':>8} {'ms/save':>9}")
+        try:
+            # Everything happens inside one transaction that is rolled back at the end
+            with transaction.atomic():
+                for size in [int(n) for n in options['sizes'].split(',')]:
+                    self.bench(size, options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+        self.stdout.write(self.style.SUCCESS("Done. (all benchmark rows rolled back)"))
+
+    def bench(self, size, repeat):
+        rng = random.Random(size)
+        exam = ExamName.objects.create(name=f'bench-{size}')
+        series = TestSeries.objects.create(name='bench', description='', category=exam)
+        test = Test.objects.create(title='bench', duration_minutes=60, test_series=series)
+        section = Section.objects.create(name='bench', number_of_questions=size, test=test)
+        Question.objects.bulk_create([
+            Question(section=section, question_text='q', option_a='a', option_b='b', option_c='c', option_d='d',
+                     correct_option='a')
+            for _ in range(size)
+        ])
+        question_ids = list(Question.objects.filter(section=section).values_list('id', flat=True))
+
+        for name, save in (('legacy', legacy_save), ('bulk', bulk_save)):
+            user = CustomUser.objects.create(email=f'{name}-{size}@bench.local', phone=f'{name[:3]}{size}')
+            # The first save creates the attempt and all rows; time the steady-state saves after it
+            save(user, test.id, 3600, [{'question_id': q, 'selected_answer': 'a'} for q in question_ids])
+            sheets = [
+                [{'question_id': q, 'selected_answer': rng.choice('abcd')} for q in question_ids]
+                for _ in range(repeat)
+            ]
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                started = time.perf_counter()
+                for i, sheet in enumerate(sheets):
+                    save(user, test.id, 3600 - i, sheet)
+                elapsed = time.perf_counter() - started
+            queries = counter.count / repeat
+            self.stdout.write(f"{size:>8} {name:>8} {queries:>8.0f} {elapsed / repeat * 1000:>9.2f}")
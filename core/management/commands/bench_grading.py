@@ -0,0 +1,67 @@
+# core/management/commands/bench_grading.py
+
+import random
+import timeit
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from core.grading import AnswerKey, align_answers, grade
+
+
+def legacy_grade(questions, answers, marks_correct, marks_incorrect):
+    """The per-question loop SubmitTestView used before the grading engine (kept for comparison)."""
+    score = 0.0
+    correct_answers = {q_id: option for q_id, option in questions}
+    user_answers_map = {ans['question_id']: ans for ans in answers}
+    results = []
+    for q_id, _ in questions:
+        is_correct = False
+        selected_answer = None
+        if q_id in user_answers_map:
+            selected_answer = user_answers_map[q_id].get('selected_answer')
+            if selected_answer:
+                if selected_answer.lower() == correct_answers[q_id]:
+                    is_correct = True
+                    score += float(marks_correct)
+                else:
+                    score -= float(marks_incorrect)
+        results.append((q_id, selected_answer, is_correct))
+    return score
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark: legacy grading loop vs core.grading engine (no database needed)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='100,1000,10000', help='Comma separated question counts')
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        marks_correct, marks_incorrect = Decimal('2.00'), Decimal('0.50')
+
+        self.stdout.write(f"{'questions':>10} {'legacy (ms)':>12} {'engine (ms)':>12} {'speedup':>8}")
+        for size in [int(n) for n in options['sizes'].split(',')]:
+            question_ids = list(range(1, size + 1))
+            key_options = ''.join(rng.choice('abcd') for _ in question_ids)
+            section_ids = [1 + i * 4 // size for i in range(size)]
+            key = AnswerKey(1, 1, question_ids, key_options, section_ids)
+            questions = list(zip(question_ids, key_options))
+            # ~80% attempted, like a typical mock
+            answers = [
+                {'question_id': q_id, 'selected_answer': rng.choice('abcd'), 'marked_for_review': False}
+                for q_id in question_ids if rng.random() < 0.8
+            ]
+
+            def run_engine():
+                selected, marked = align_answers(key, answers)
+                return grade(key, selected, marked, marks_correct, marks_incorrect)
+
+            # Same inputs must give the same score
+            assert abs(legacy_grade(questions, answers, marks_correct, marks_incorrect) - float(run_engine().score)) < 1e-6
+
+            repeat = options['repeat']
+            legacy = timeit.timeit(lambda: legacy_grade(questions, answers, marks_correct, marks_incorrect), number=repeat) / repeat
+            engine = timeit.timeit(run_engine, number=repeat) / repeat
+            self.stdout.write(f"{size:>10} {legacy * 1000:>12.3f} {engine * 1000:>12.3f} {legacy / engine:>7.2f}x")
+
+        self.stdout.write(self.style.SUCCESS("Done."))
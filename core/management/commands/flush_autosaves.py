@@ -0,0 +1,29 @@
+# core/management/commands/flush_autosaves.py
+
+import time
+from django.core.management.base import BaseCommand
+from core.autosave import flush_buffer
+
+
+class Command(BaseCommand):
+    help = 'Persists buffered autosaves (AUTOSAVE_MODE = "buffered") to the database in batches. Run a single instance.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Queued saves read per batch')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to sleep when nothing is queued')
+        parser.add_argument('--once', action='store_true', help='Flush what is queued and exit instead of polling forever')
+
+    def handle(self, *args, **options):
+        total = 0
+        self.stdout.write("Waiting for autosaves..." if not options['once'] else "Flushing autosave buffer...")
+        while True:
+            saves, flushed = flush_buffer(options['batch_size'])
+            total += flushed
+            if saves:
+                self.stdout.write(f"Flushed {flushed} attempt(s) from {saves} save(s) ({total} so far)")
+            elif options['once']:
+                break
+            else:
+                time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"\nTask Complete. Flushed {total} attempts."))
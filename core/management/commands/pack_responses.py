@@ -0,0 +1,53 @@
+# core/management/commands/pack_responses.py
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from core.answersheets import pack_sheet
+from core.models import TestResult, UserResponse
+
+
+class Command(BaseCommand):
+    help = 'Converts completed row-based answer sheets into packed form (RESPONSE_STORAGE = "packed")'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--test', type=int, action='append', dest='test_ids', help='Only this Test ID (repeatable)')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Results per transaction')
+        parser.add_argument('--delete-rows', action='store_true', help='Delete the UserResponse rows once packed')
+
+    def handle(self, *args, **options):
+        results = TestResult.objects.filter(is_completed=True, layout__isnull=True)
+        if options['test_ids']:
+            results = results.filter(test_id__in=options['test_ids'])
+        result_ids = list(results.order_by('id').values_list('id', flat=True))
+        chunk_size = options['chunk_size']
+        self.stdout.write(f"Packing {len(result_ids)} result(s)...")
+
+        packed = 0
+        for start in range(0, len(result_ids), chunk_size):
+            chunk = result_ids[start:start + chunk_size]
+            rows_by_result = {result_id: [] for result_id in chunk}
+            # Same (section, question) order as the answer key
+            for row in UserResponse.objects.filter(test_result_id__in=chunk).order_by(
+                'question__section_id', 'question_id'
+            ).values_list('test_result_id', 'question_id', 'selected_answer', 'is_correct', 'marked_for_review'):
+                rows_by_result[row[0]].append(row)
+
+            to_update = []
+            for result in TestResult.objects.filter(id__in=chunk).only('id', 'test_id'):
+                rows = rows_by_result[result.id]
+                if not rows:
+                    continue  # nothing was stored for this attempt
+                _, question_ids, selected, correct, marked = zip(*rows)
+                pack_sheet(result, question_ids, selected, correct, marked)
+                to_update.append(result)
+
+            with transaction.atomic():
+                TestResult.objects.bulk_update(
+                    to_update, ['layout', 'packed_answers', 'packed_correct', 'packed_review'], batch_size=chunk_size
+                )
+                if options['delete_rows']:
+                    UserResponse.objects.filter(test_result_id__in=[r.id for r in to_update]).delete()
+            packed += len(to_update)
+            self.stdout.write(f"  {packed}/{len(result_ids)} packed")
+
+        self.stdout.write(self.style.SUCCESS(f"\nTask Complete. Packed {packed} results."))
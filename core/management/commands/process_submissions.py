@@ -0,0 +1,30 @@
+# core/management/commands/process_submissions.py
+
+import time
+from django.core.management.base import BaseCommand
+from core.submissions import process_pending
+
+
+class Command(BaseCommand):
+    help = 'Grades queued (async mode) test submissions in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--workers', type=int, default=4, help='Threads grading each batch')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Drain the queue and exit instead of polling forever')
+
+    def handle(self, *args, **options):
+        total = 0
+        self.stdout.write("Waiting for submissions..." if not options['once'] else "Draining submission queue...")
+        while True:
+            claimed = process_pending(options['batch_size'], options['workers'])
+            total += claimed
+            if claimed:
+                self.stdout.write(f"Graded {claimed} submission(s) ({total} so far)")
+            elif options['once']:
+                break
+            else:
+                time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"\nTask Complete. Processed {total} submissions."))
@@ -0,0 +1,33 @@
+# core/management/commands/rebuild_aggregate_scores.py
+
+from django.core.management.base import BaseCommand
+from core.aggregates import delete_orphaned_scores, rebuild_scope
+from core.models import ExamName, TestSeries
+
+
+class Command(BaseCommand):
+    help = 'Recomputes series and exam leaderboards from the per-test leaderboards (run rebuild_leaderboards first)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--series', type=int, action='append', help='Only this TestSeries ID (repeatable)')
+        parser.add_argument('--exam', type=int, action='append', help='Only this ExamName ID (repeatable)')
+
+    def handle(self, *args, **options):
+        scopes = []
+        if options['series'] or options['exam']:
+            scopes += [('series', pk) for pk in options['series'] or []]
+            scopes += [('exam', pk) for pk in options['exam'] or []]
+        else:
+            scopes += [('series', pk) for pk in TestSeries.objects.order_by('id').values_list('id', flat=True)]
+            scopes += [('exam', pk) for pk in ExamName.objects.order_by('id').values_list('id', flat=True)]
+        self.stdout.write(f"Rebuilding {len(scopes)} aggregate leaderboard(s)...")
+
+        for scope, scope_id in scopes:
+            users = rebuild_scope(scope, scope_id)
+            self.stdout.write(f"  {scope} {scope_id}: {users} users")
+
+        if not (options['series'] or options['exam']):
+            # scope_id is not a foreign key; rows of deleted series / exams are only removed here
+            self.stdout.write(f"Removed {delete_orphaned_scores()} row(s) of deleted series / exams")
+
+        self.stdout.write(self.style.SUCCESS("\nTask Complete."))
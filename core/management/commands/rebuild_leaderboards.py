@@ -0,0 +1,25 @@
+# core/management/commands/rebuild_leaderboards.py
+
+from django.core.management.base import BaseCommand
+from core.leaderboard import rebuild_test_leaderboard
+from core.models import Test
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the per-test leaderboard tables from completed results (all tests by default)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('test_ids', nargs='*', type=int, help='Only these Test IDs')
+
+    def handle(self, *args, **options):
+        tests = Test.objects.order_by('id')
+        if options['test_ids']:
+            tests = tests.filter(pk__in=options['test_ids'])
+        test_ids = list(tests.values_list('id', flat=True))
+        self.stdout.write(f"Rebuilding {len(test_ids)} leaderboard(s)...")
+
+        for test_id in test_ids:
+            entries = rebuild_test_leaderboard(test_id)
+            self.stdout.write(f"  Test {test_id}: {entries} entries")
+
+        self.stdout.write(self.style.SUCCESS("\nTask Complete."))
@@ -0,0 +1,25 @@
+# core/management/commands/rebuild_percentiles.py
+
+from django.core.management.base import BaseCommand
+from core.models import Test
+from core.percentiles import build_distribution
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the cached percentile histograms from the leaderboard tables (all tests by default)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('test_ids', nargs='*', type=int, help='Only these Test IDs')
+
+    def handle(self, *args, **options):
+        tests = Test.objects.order_by('id')
+        if options['test_ids']:
+            tests = tests.filter(pk__in=options['test_ids'])
+        test_ids = list(tests.values_list('id', flat=True))
+        self.stdout.write(f"Rebuilding {len(test_ids)} distribution(s)...")
+
+        for test_id in test_ids:
+            histogram = build_distribution(test_id)
+            self.stdout.write(f"  Test {test_id}: {sum(histogram.counts())} scores in {histogram.buckets} buckets")
+
+        self.stdout.write(self.style.SUCCESS("\nTask Complete."))
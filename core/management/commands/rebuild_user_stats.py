@@ -0,0 +1,24 @@
+# core/management/commands/rebuild_user_stats.py
+
+from django.core.management.base import BaseCommand
+from core.models import CustomUser
+from core.userstats import rebuild_user_stats
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the per-user dashboard totals (UserStats) from completed results'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', help='Only this user ID (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        user_ids = options['user'] or list(CustomUser.objects.order_by('id').values_list('id', flat=True))
+        batch_size = options['batch_size']
+        self.stdout.write(f"Rebuilding stats for {len(user_ids)} user(s)...")
+
+        for start in range(0, len(user_ids), batch_size):
+            rebuild_user_stats(user_ids[start:start + batch_size])
+            self.stdout.write(f"  {min(start + batch_size, len(user_ids))}/{len(user_ids)}")
+
+        self.stdout.write(self.style.SUCCESS("\nTask Complete."))
@@ -0,0 +1,66 @@
+# core/management/commands/regrade_test.py
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from django.core.management.base import BaseCommand, CommandError
+from core.models import Test
+
+
+def _init_worker():
+    # Forked workers must not reuse the parent's DB connections; spawned ones need Django set up
+    import django
+    from django.apps import apps
+    from django.db import connections
+    if not apps.ready:
+        django.setup()
+    connections.close_all()
+
+
+def _regrade_in_worker(test_id, chunk_size):
+    from core.grading import regrade_test
+    test = Test.objects.get(pk=test_id)
+    return test_id, regrade_test(test, chunk_size=chunk_size)
+
+
+class Command(BaseCommand):
+    help = 'Re-scores all completed attempts of the given tests (or a whole series) after an answer key / marks fix'
+
+    def add_arguments(self, parser):
+        parser.add_argument('test_ids', nargs='*', type=int, help='Test IDs to regrade')
+        parser.add_argument('--series', type=int, help='Regrade every test in this TestSeries ID')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Attempts per bulk update')
+        parser.add_argument('--workers', type=int, default=1, help='Processes to spread tests across')
+
+    def handle(self, *args, **options):
+        tests = Test.objects.none()
+        if options['test_ids']:
+            tests = Test.objects.filter(pk__in=options['test_ids'])
+        if options['series']:
+            tests = tests | Test.objects.filter(test_series_id=options['series'])
+        test_ids = list(tests.order_by('id').values_list('id', flat=True))
+        if not test_ids:
+            raise CommandError("No tests matched. Pass test IDs and/or --series.")
+
+        chunk_size = options['chunk_size']
+        self.stdout.write(f"Regrading {len(test_ids)} test(s)...")
+
+        if options['workers'] > 1 and len(test_ids) > 1:
+            from django.db import connections
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+                futures = [pool.submit(_regrade_in_worker, test_id, chunk_size) for test_id in test_ids]
+                for future in as_completed(futures):
+                    test_id, (attempts, changed) = future.result()
+                    self.report(test_id, attempts, changed)
+        else:
+            from core.grading import regrade_test
+            for test in Test.objects.filter(pk__in=test_ids).order_by('id'):
+                attempts, changed = regrade_test(test, chunk_size=chunk_size, on_progress=self.progress)
+                self.report(test.id, attempts, changed)
+
+        self.stdout.write(self.style.SUCCESS("\nRegrade complete."))
+
+    def progress(self, test, done, total):
+        self.stdout.write(f"  {test.title}: {done}/{total} attempts")
+
+    def report(self, test_id, attempts, changed):
+        self.stdout.write(self.style.SUCCESS(f"Test {test_id}: {attempts} attempts regraded, {changed} responses changed"))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_coupon'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='test',
+            name='paper_version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Bumped whenever the test, its sections or questions change'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_pendingsubmission'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testresult',
+            name='packed_answers',
+            field=models.TextField(blank=True, default='', help_text="'a'-'d' per question, '-' if skipped"),
+        ),
+        migrations.AddField(
+            model_name='testresult',
+            name='packed_correct',
+            field=models.TextField(blank=True, default='', help_text="'1' per correctly answered question"),
+        ),
+        migrations.AddField(
+            model_name='testresult',
+            name='packed_review',
+            field=models.TextField(blank=True, default='', help_text="'1' per question marked for review"),
+        ),
+        migrations.CreateModel(
+            name='AnswerLayout',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(help_text='sha1 of question_ids', max_length=40)),
+                ('question_ids', models.TextField(help_text='Comma separated Question IDs, in packing order')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answer_layouts', to='core.test')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='testresult',
+            name='layout',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='core.answerlayout'),
+        ),
+        migrations.AddConstraint(
+            model_name='answerlayout',
+            constraint=models.UniqueConstraint(fields=('test', 'digest'), name='unique_answer_layout'),
+        ),
+    ]
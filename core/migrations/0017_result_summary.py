@@ -0,0 +1,43 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_packed_answer_sheets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testresult',
+            name='accuracy',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Correct / attempted, in %', max_digits=5, null=True),
+        ),
+        migrations.AddField(
+            model_name='testresult',
+            name='attempted_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='testresult',
+            name='correct_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='testresult',
+            name='incorrect_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='testresult',
+            name='total_questions',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='testresult',
+            name='unanswered_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_result_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testresult',
+            name='section_stats',
+            field=models.JSONField(blank=True, help_text='{"<section_id>": {"attempted": n, "correct": n}}', null=True),
+        ),
+    ]
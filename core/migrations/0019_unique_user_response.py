@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:10
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def delete_duplicate_responses(apps, schema_editor):
+    # Racing update_or_create autosaves could leave several rows for one question;
+    # keep the newest one (highest id) of each pair before adding the constraint.
+    UserResponse = apps.get_model('core', 'UserResponse')
+    duplicates = (
+        UserResponse.objects.values('test_result_id', 'question_id')
+        .annotate(keep_id=Max('id'), rows=models.Count('id'))
+        .filter(rows__gt=1)
+        .order_by()
+    )
+    for dup in duplicates.iterator():
+        UserResponse.objects.filter(
+            test_result_id=dup['test_result_id'], question_id=dup['question_id'], id__lt=dup['keep_id']
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_result_section_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_responses, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='userresponse',
+            constraint=models.UniqueConstraint(fields=('test_result', 'question'), name='unique_response_per_question'),
+        ),
+    ]
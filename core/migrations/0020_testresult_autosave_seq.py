@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_unique_user_response'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testresult',
+            name='autosave_seq',
+            field=models.PositiveIntegerField(default=0, help_text='Highest client sequence number applied by autosave'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_testresult_autosave_seq'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('time_remaining', models.IntegerField(default=0)),
+                ('accuracy', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('completed_at', models.DateTimeField()),
+                ('result', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.testresult')),
+                ('test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to='core.test')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['test', '-score', '-time_remaining', 'id'], name='leaderboard_rank_idx')],
+                'constraints': [models.UniqueConstraint(fields=('test', 'user'), name='unique_leaderboard_entry')],
+            },
+        ),
+    ]
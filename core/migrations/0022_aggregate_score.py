@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_leaderboard_entry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AggregateScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('series', 'Test series'), ('exam', 'Exam')], max_length=10)),
+                ('scope_id', models.PositiveIntegerField(help_text='TestSeries or ExamName id')),
+                ('tests_taken', models.PositiveIntegerField(default=0)),
+                ('total_score', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('average_score', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['scope', 'scope_id', '-total_score', 'id'], name='aggregate_total_idx'), models.Index(fields=['scope', 'scope_id', '-average_score', 'id'], name='aggregate_average_idx')],
+                'constraints': [models.UniqueConstraint(fields=('scope', 'scope_id', 'user'), name='unique_aggregate_score')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_user_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='current_streak',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='last_active_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='longest_streak',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
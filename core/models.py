@@ -107,6 +107,10 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     is_staff = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
     is_pro_member = models.BooleanField(default=False)
+    # Practice streak, kept up to date on submission (see core/streaks.py)
+    current_streak = models.PositiveIntegerField(default=0)
+    longest_streak = models.PositiveIntegerField(default=0)
+    last_active_date = models.DateField(null=True, blank=True)
     objects = CustomUserManager() # Use the manager we just defined
     
     USERNAME_FIELD = 'email' # Use email to log in
@@ -183,10 +187,13 @@ class Test(models.Model):
     is_published = models.BooleanField(default=False, help_text="Check this ONLY when questions are added")
     marks_correct = models.DecimalField(max_digits=5, decimal_places=2, default=1.00)
     marks_incorrect = models.DecimalField(max_digits=5, decimal_places=2, default=1.00)
+    paper_version = models.PositiveIntegerField(default=1, editable=False, help_text="Bumped whenever the test, its sections or questions change")
     def __str__(self):
         return self.title
     
     def save(self, *args, **kwargs):
+        bump_version = self.pk is not None
+
         # Only run automation on creation (no ID yet)
         if not self.pk:
             existing_count = 0
@@ -203,9 +210,16 @@ class Test(models.Model):
                 self.is_free = True
             else:
                 self.is_free = False
+        else:
+            # Any edit invalidates the cached paper snapshot.
+            # Incrementing in SQL keeps a stale admin form from rolling the version back.
+            self.paper_version = models.F('paper_version') + 1
                 
         super().save(*args, **kwargs)
 
+        if bump_version:
+            self.refresh_from_db(fields=['paper_version'])
+
 
 class Section(models.Model):
     name=models.CharField(max_length=100)
@@ -237,6 +251,22 @@ class Question(models.Model):
 
     correct_option = models.CharField(max_length=1, choices=[('a','A'), ('b','B'), ('c','C'), ('d','D')])
 
+    # Text columns that have a Hindi twin named "<field>_hi"
+    BILINGUAL_FIELDS = ('question_text', 'option_a', 'option_b', 'option_c', 'option_d', 'explanation')
+    LANGUAGES = ('en', 'hi', 'both')
+
+    @classmethod
+    def language_columns(cls, lang, explanation=True):
+        """Text columns to load for a paper language ('en', 'hi' or 'both')."""
+        base = [f for f in cls.BILINGUAL_FIELDS if explanation or f != 'explanation']
+        english = list(base)
+        hindi = [f'{f}_hi' for f in base]
+        if lang == 'en':
+            return english
+        if lang == 'hi':
+            return hindi
+        return english + hindi
+
     def __str__(self):
         return f"{self.section.test} - {self.section.name} - {self.question_text[:30]}..."
     
@@ -246,6 +276,23 @@ class Question(models.Model):
 
 # Add these two new classes to the end of your core/models.py file
 
+class AnswerLayout(models.Model):
+    """Question order of a test at the time attempts were packed.
+    Shared by every packed TestResult with the same question list (see core/answersheets.py)."""
+    test = models.ForeignKey(Test, related_name='answer_layouts', on_delete=models.CASCADE)
+    digest = models.CharField(max_length=40, help_text="sha1 of question_ids")
+    question_ids = models.TextField(help_text="Comma separated Question IDs, in packing order")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['test', 'digest'], name='unique_answer_layout'),
+        ]
+
+    def __str__(self):
+        return f"{self.test.title} layout {self.digest[:8]}"
+
+
 class TestResult(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
   
@@ -255,6 +302,24 @@ class TestResult(models.Model):
     is_completed = models.BooleanField(default=False)
     time_remaining=models.IntegerField(default=0, help_text="Time remaining in seconds")
     last_updated = models.DateTimeField(auto_now=True)
+    autosave_seq = models.PositiveIntegerField(default=0, help_text="Highest client sequence number applied by autosave")
+
+    # Packed answer sheet (RESPONSE_STORAGE = 'packed'); one character per question of `layout`.
+    # When layout is empty the answers live in UserResponse rows instead.
+    layout = models.ForeignKey(AnswerLayout, null=True, blank=True, on_delete=models.CASCADE)
+    packed_answers = models.TextField(blank=True, default='', help_text="'a'-'d' per question, '-' if skipped")
+    packed_correct = models.TextField(blank=True, default='', help_text="'1' per correctly answered question")
+    packed_review = models.TextField(blank=True, default='', help_text="'1' per question marked for review")
+
+    # Summary written once when the attempt is graded (and again by regrades).
+    # Empty for results older than the `backfill_result_summary` command.
+    total_questions = models.PositiveIntegerField(null=True, blank=True)
+    correct_count = models.PositiveIntegerField(null=True, blank=True)
+    incorrect_count = models.PositiveIntegerField(null=True, blank=True)
+    unanswered_count = models.PositiveIntegerField(null=True, blank=True)
+    attempted_count = models.PositiveIntegerField(null=True, blank=True)
+    accuracy = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True, help_text="Correct / attempted, in %")
+    section_stats = models.JSONField(null=True, blank=True, help_text='{"<section_id>": {"attempted": n, "correct": n}}')
 
     def __str__(self):
         return f"{self.user.first_name} {self.user.last_name} - {self.test.title}"
@@ -268,12 +333,124 @@ class UserResponse(models.Model):
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     selected_answer = models.CharField(max_length=1, blank=True, null=True)
     marked_for_review = models.BooleanField(default=False)
-    
-   
+
+    class Meta:
+        # One answer per question per attempt; autosave upserts against it
+        constraints = [
+            models.UniqueConstraint(fields=['test_result', 'question'], name='unique_response_per_question'),
+        ]
 
     def __str__(self):
         return f"Response for Q{self.question_id}"
 
+class PendingSubmission(models.Model):
+    """Durable queue of submitted answer sheets waiting to be graded (async submit mode).
+    Filled by SubmitTestView, drained by the `process_submissions` command."""
+    STATUS_CHOICES = (
+        ('PENDING', 'Pending'),
+        ('PROCESSING', 'Processing'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    )
+
+    test_result = models.ForeignKey(TestResult, related_name='pending_submissions', on_delete=models.CASCADE)
+    answers = models.JSONField(default=list)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING', db_index=True)
+    attempts = models.PositiveIntegerField(default=0, help_text="How many times a worker tried to grade it")
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']  # First in, first out
+
+    def __str__(self):
+        return f"Submission for result {self.test_result_id} ({self.status})"
+
+class LeaderboardEntry(models.Model):
+    """A user's best completed attempt at a test (highest score, then most time left).
+    Kept up to date by finalize_submission and regrade_test; see core/leaderboard.py."""
+    test = models.ForeignKey(Test, related_name='leaderboard_entries', on_delete=models.CASCADE)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    result = models.ForeignKey(TestResult, related_name='+', on_delete=models.CASCADE)
+    score = models.DecimalField(max_digits=6, decimal_places=2)
+    time_remaining = models.IntegerField(default=0)
+    accuracy = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    completed_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['test', 'user'], name='unique_leaderboard_entry'),
+        ]
+        indexes = [
+            # Ranking order: top-N and rank counts are range scans on this index
+            models.Index(fields=['test', '-score', '-time_remaining', 'id'], name='leaderboard_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} on {self.test_id}: {self.score}"
+
+class AggregateScore(models.Model):
+    """A user's best-attempt scores summed over every test of a TestSeries or of an ExamName.
+    Maintained from LeaderboardEntry changes; see core/aggregates.py."""
+    SCOPE_CHOICES = (
+        ('series', 'Test series'),
+        ('exam', 'Exam'),
+    )
+
+    scope = models.CharField(max_length=10, choices=SCOPE_CHOICES)
+    scope_id = models.PositiveIntegerField(help_text="TestSeries or ExamName id")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    tests_taken = models.PositiveIntegerField(default=0)
+    total_score = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    average_score = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'scope_id', 'user'], name='unique_aggregate_score'),
+        ]
+        indexes = [
+            models.Index(fields=['scope', 'scope_id', '-total_score', 'id'], name='aggregate_total_idx'),
+            models.Index(fields=['scope', 'scope_id', '-average_score', 'id'], name='aggregate_average_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} on {self.scope} {self.scope_id}: {self.total_score}"
+
+class UserStats(models.Model):
+    """Running totals over all of a user's completed attempts, for the dashboard stat cards.
+    Updated by finalize_submission and regrade_test; see core/userstats.py."""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, primary_key=True, related_name='stats', on_delete=models.CASCADE)
+    tests_taken = models.PositiveIntegerField(default=0)
+    score_sum = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    correct = models.PositiveIntegerField(default=0)
+    incorrect = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Stats of {self.user_id}: {self.tests_taken} tests"
+
+
+class DailyActivity(models.Model):
+    """One row per user and active day: attempts completed and questions answered that day.
+    Filled by finalize_submission; see core/activity.py."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='daily_activity')
+    day = models.DateField()
+    tests_taken = models.PositiveIntegerField(default=0)
+    questions_answered = models.PositiveIntegerField(default=0)
+    correct = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Also the index behind "a user's last N days"
+            models.UniqueConstraint(fields=['user', 'day'], name='unique_daily_activity'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} on {self.day}: {self.tests_taken} tests"
+
 class PhoneOTP(models.Model):
     phone_number = models.CharField(max_length=15, unique=True)
     otp = models.CharField(max_length=6)
@@ -0,0 +1,111 @@
+# core/papers.py
+"""
+Cached snapshots of published exam papers.
+
+A paper is the same for every candidate, so it is serialized once per
+`Test.paper_version` and language, stored as a pre-encoded, pre-gzipped
+JsonBlob (see core/blobs.py) and served from the cache. Editing the test,
+a section or a question bumps the version (see core/signals.py), so old
+snapshots are simply never looked up again and expire on their own.
+
+Besides the full paper there is a light manifest (sections and counts) and one
+snapshot per section, so clients can render the first section before the rest
+of a long paper has been fetched.
+"""
+from django.core.cache import cache
+from django.db.models import Count, Prefetch, prefetch_related_objects
+from django.http import Http404
+from rest_framework.exceptions import ValidationError
+from .blobs import JsonBlob
+from .models import Section, Question
+from .serializers import TestSectionSerializer, SectionSerializer
+
+PAPER_CACHE_TIMEOUT = 60 * 60 * 24  # 1 day
+
+
+def get_paper_language(request):
+    """Reads ?lang=en|hi|both (default both).
+    Note: 'hi' only sends the Hindi columns, which are empty for untranslated questions."""
+    lang = request.query_params.get('lang', 'both')
+    if lang not in Question.LANGUAGES:
+        raise ValidationError({"lang": f"Must be one of: {', '.join(Question.LANGUAGES)}."})
+    return lang
+
+
+def paper_cache_key(test, *parts):
+    return ':'.join([f"paper:{test.pk}:v{test.paper_version}", *map(str, parts)])
+
+
+def question_queryset(lang='both'):
+    """Questions with only the columns the paper serializer needs for `lang`."""
+    columns = Question.language_columns(lang, explanation=False)
+    return Question.objects.only('id', 'section', *columns).order_by('id')
+
+
+def load_paper(test, lang='both'):
+    """Attaches the sections and their questions to an already fetched test.
+    Always two queries (sections, then questions), however many sections there are."""
+    prefetch_related_objects(
+        [test],
+        Prefetch('sections', queryset=Section.objects.order_by('id')),
+        Prefetch('sections__questions', queryset=question_queryset(lang)),
+    )
+    return test
+
+
+def build_paper_snapshot(test, lang='both'):
+    """Serializes the shared part of the paper (no per-user fields)."""
+    serializer = TestSectionSerializer(load_paper(test, lang), context={'lang': lang})
+    return JsonBlob(serializer.data)
+
+
+def get_paper_snapshot(test, lang='both'):
+    """Returns the cached paper blob for this version of the test, building it on a miss.
+    Per-user fields are passed as `extra` when rendering it (see blob_response)."""
+    key = paper_cache_key(test, lang)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_paper_snapshot(test, lang)
+        cache.set(key, snapshot, PAPER_CACHE_TIMEOUT)
+    return snapshot
+
+
+def build_paper_manifest(test):
+    """The paper without questions: sections, question counts and duration."""
+    sections = [
+        {
+            "id": section.id,
+            "name": section.name,
+            "number_of_questions": section.number_of_questions,
+            "question_count": section.question_count,
+        }
+        for section in Section.objects.filter(test=test).annotate(question_count=Count('questions')).order_by('id')
+    ]
+    return JsonBlob({
+        "id": test.id,
+        "title": test.title,
+        "duration_minutes": test.duration_minutes,
+        "total_questions": sum(s["question_count"] for s in sections),
+        "sections": sections,
+    })
+
+
+def get_paper_manifest(test):
+    return cache.get_or_set(paper_cache_key(test, 'manifest'), lambda: build_paper_manifest(test), PAPER_CACHE_TIMEOUT)
+
+
+def build_section_snapshot(test, section_id, lang='both'):
+    """One section with its questions; raises Http404 if it is not part of `test`."""
+    section = (
+        Section.objects.filter(test=test, pk=section_id)
+        .prefetch_related(Prefetch('questions', queryset=question_queryset(lang)))
+        .first()
+    )
+    if section is None:
+        raise Http404("Section not found in this test.")
+    return JsonBlob(SectionSerializer(section, context={'lang': lang}).data)
+
+
+def get_section_snapshot(test, section_id, lang='both'):
+    key = paper_cache_key(test, lang, f's{section_id}')
+    return cache.get_or_set(key, lambda: build_section_snapshot(test, section_id, lang), PAPER_CACHE_TIMEOUT)
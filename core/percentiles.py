@@ -0,0 +1,156 @@
+# core/percentiles.py
+"""
+Percentiles from a cached histogram of every user's best score on a test.
+
+Scores are counted in a fixed set of buckets, one cache counter each. The
+buckets follow the test's score grid: every score is a multiple of the
+gcd of marks_correct and marks_incorrect (in hundredths, the DB keeps 2
+decimal places), between -questions * marks_incorrect and questions *
+marks_correct. While that grid has at most HISTOGRAM_BUCKETS points each
+bucket holds exactly one score, so percentiles are exact; on finer grids
+neighbouring scores share a bucket and count as tied.
+
+A submission that changes a user's best moves them between two buckets after
+commit (update_distribution): cache.incr / cache.decr, O(1) and atomic, so
+concurrent submits don't lose each other's update. percentile_for() reads the
+counters in one get_many.
+
+Staleness bound: the histogram is rebuilt from LeaderboardEntry (one indexed
+read) once it is older than PERCENTILE_MAX_AGE, by one reader at a time. That
+corrects counters that were evicted or moved while a rebuild was reading the
+table. regrade_test drops the histogram, and `rebuild_percentiles` rebuilds on
+demand.
+"""
+import math
+import time
+from decimal import Decimal
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db.models import Count
+
+from .models import LeaderboardEntry, Question, Test
+
+PERCENTILE_MAX_AGE = 5 * 60  # seconds
+REBUILD_LOCK_TIMEOUT = 60    # seconds; a rebuild that died frees the lock after this
+HISTOGRAM_BUCKETS = 500      # most counters per test; a percentile read fetches all of them
+# Counters outlive their layout entry, so a layout never points at expired counters
+COUNTER_TIMEOUT = PERCENTILE_MAX_AGE * 2 + 60
+
+
+def distribution_cache_key(test_id):
+    return f"percentiles:{test_id}"
+
+
+def to_hundredths(score):
+    return int(round(score * 100))
+
+
+class Histogram:
+    """Layout of one build: buckets of `width` hundredths starting at `low`, and their counter keys."""
+
+    def __init__(self, layout):
+        self.test_id = layout['test_id']
+        self.built_at = layout['built_at']
+        self.token = layout['token']
+        self.low = layout['low']
+        self.width = layout['width']
+        self.buckets = layout['buckets']
+
+    def bucket_of(self, score):
+        """Bucket of a score; scores outside the range (paper edited since the build) go to the edges."""
+        return min(max((to_hundredths(score) - self.low) // self.width, 0), self.buckets - 1)
+
+    def upper_bound(self, bucket):
+        """Lowest score of the next bucket, or None for the top bucket (which also takes anything above)."""
+        if bucket >= self.buckets - 1:
+            return None
+        return Decimal(self.low + (bucket + 1) * self.width) / 100
+
+    def counter_key(self, bucket):
+        return f"{distribution_cache_key(self.test_id)}:{self.token}:{bucket}"
+
+    def counts(self):
+        """Users per bucket, lowest scores first."""
+        keys = [self.counter_key(bucket) for bucket in range(self.buckets)]
+        found = cache.get_many(keys)
+        return [found.get(key, 0) for key in keys]
+
+
+def histogram_layout(test_id):
+    """The score grid of a test, from its marks and question count."""
+    marks_correct, marks_incorrect = Test.objects.values_list('marks_correct', 'marks_incorrect').get(pk=test_id)
+    questions = Question.objects.filter(section__test_id=test_id).count()
+    correct, incorrect = to_hundredths(marks_correct), to_hundredths(marks_incorrect)
+    step = math.gcd(correct, incorrect) or 1
+    low, high = -questions * incorrect, questions * correct
+    width = step * math.ceil(((high - low) // step + 1) / HISTOGRAM_BUCKETS)
+    return {'test_id': test_id, 'low': low, 'width': width, 'buckets': (high - low) // width + 1}
+
+
+def build_distribution(test_id):
+    """Counts the best scores of a test into a new set of counters and publishes their layout."""
+    layout = histogram_layout(test_id)
+    layout.update(built_at=time.time(), token=uuid4().hex[:8])
+    histogram = Histogram(layout)
+
+    counts = [0] * histogram.buckets
+    for score, users in (
+        LeaderboardEntry.objects.filter(test_id=test_id).values('score').annotate(users=Count('id')).order_by()
+        .values_list('score', 'users')
+    ):
+        counts[histogram.bucket_of(score)] += users
+    # Every counter exists before the layout is published, so incr/decr never miss one
+    cache.set_many({histogram.counter_key(b): count for b, count in enumerate(counts)}, COUNTER_TIMEOUT)
+    cache.set(distribution_cache_key(test_id), layout, PERCENTILE_MAX_AGE * 2)
+    return histogram
+
+
+def get_distribution(test_id):
+    """The current Histogram of a test, built on a miss and rebuilt when too old."""
+    key = distribution_cache_key(test_id)
+    layout = cache.get(key)
+    if layout is None:
+        return build_distribution(test_id)
+    if time.time() - layout['built_at'] > PERCENTILE_MAX_AGE:
+        # One reader rebuilds; the rest use the current counters until it is replaced
+        if cache.add(f"{key}:rebuilding", True, REBUILD_LOCK_TIMEOUT):
+            try:
+                return build_distribution(test_id)
+            finally:
+                cache.delete(f"{key}:rebuilding")
+    return Histogram(layout)
+
+
+def percentile_for(test_id, score):
+    """Share of users (best attempts) who scored less than `score`, in %."""
+    histogram = get_distribution(test_id)
+    counts = histogram.counts()
+    total_students = sum(counts)
+    if total_students <= 1:
+        return 100.00  # If you are the only one, you are top 100%
+    students_behind = sum(counts[:histogram.bucket_of(score)])
+    return round(students_behind / total_students * 100, 2)
+
+
+def update_distribution(test_id, old_score, new_score):
+    """Moves one user's best from old_score (None for a first attempt) to new_score."""
+    layout = cache.get(distribution_cache_key(test_id))
+    if layout is None:
+        return  # built from the leaderboard on the next read
+    histogram = Histogram(layout)
+    new_bucket = histogram.bucket_of(new_score)
+    old_bucket = None if old_score is None else histogram.bucket_of(old_score)
+    if old_bucket == new_bucket:
+        return
+    try:
+        cache.incr(histogram.counter_key(new_bucket))
+        if old_bucket is not None:
+            cache.decr(histogram.counter_key(old_bucket))
+    except ValueError:
+        # A counter was evicted: rebuild on the next read instead of counting from zero
+        invalidate_distribution(test_id)
+
+
+def invalidate_distribution(test_id):
+    cache.delete(distribution_cache_key(test_id))
@@ -1,15 +1,15 @@
 # core/serializers.py
 from rest_framework import serializers
 # Make sure to import all your models, including Section
-from .models import CurrentAffair, CustomUser, TestResult, TestSeries, Test, Section, Question, ExamName, TestStage, Notification
+from .models import CurrentAffair, CustomUser, TestResult, TestSeries, Test, Section, Question, ExamName, TestStage, Notification, LeaderboardEntry, AggregateScore
 from django.utils.timesince import timesince
 from dj_rest_auth.registration.serializers import RegisterSerializer
 from rest_framework.validators import UniqueValidator
 from django.core.validators import RegexValidator
 from django.db.models import Sum
-from django.utils import timezone
-from datetime import timedelta
-from django.db.models.functions import TruncDate
+from .answersheets import accuracy, get_responses, section_tally, sheet_counts
+from .percentiles import percentile_for
+from .streaks import streak_for
 
 
 
@@ -29,35 +29,8 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ('id', 'email', 'phone', 'first_name', 'last_name','is_pro_member','pro_expiry_date', 'is_pro_active', 'streak')
         
     def get_streak(self, obj):
-        # Get all completed tests for this user
-            completed_results = TestResult.objects.filter(user=obj, is_completed=True).order_by('-completed_at')
-        
-        # Get distinct dates of activity
-            activity_dates = completed_results.annotate(
-            date=TruncDate('completed_at')
-            ).values_list('date', flat=True).distinct()
-
-            current_streak = 0
-            if activity_dates:
-                today = timezone.now().date()
-                last_activity = activity_dates[0]
-
-            # Check if active today or yesterday
-                if last_activity == today or last_activity == (today - timedelta(days=1)):
-                    current_streak = 1
-                    previous_date = last_activity
-                
-                # Count backwards
-                    for date in activity_dates[1:]:
-                        if date == previous_date - timedelta(days=1):
-                            current_streak += 1
-                            previous_date = date
-                        else:
-                            break
-                else:
-                    current_streak = 0
-                
-            return current_streak
+        # Stored on the user and updated on submission (see core/streaks.py)
+        return streak_for(obj)
 
 
 
@@ -71,7 +44,21 @@ class TestSeriesListSerializer(serializers.ModelSerializer):
         model = TestSeries
         fields = ['id', 'name', 'description', 'category']
 
-class QuestionSerializer(serializers.ModelSerializer):
+class LanguageProjectionMixin:
+    """Drops the other language's text fields when the context carries lang='en' or 'hi'.
+    The view is expected to have loaded only those columns (see Question.language_columns)."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        lang = self.context.get('lang', 'both')
+        if lang == 'both':
+            return fields
+        keep = set(Question.language_columns(lang))
+        dropped = set(Question.language_columns('both')) - keep
+        return {name: field for name, field in fields.items() if name not in dropped}
+
+
+class QuestionSerializer(LanguageProjectionMixin, serializers.ModelSerializer):
     class Meta:
         model = Question
         fields = [
@@ -102,21 +89,13 @@ class SectionSerializer(serializers.ModelSerializer):
 
 
 # LEVEL 1: The main serializer for a Test, containing its Sections.
+# Only the shared paper: saved progress is per user and added by the view (get_saved_progress).
 class TestSectionSerializer(serializers.ModelSerializer):
     # This line uses the SectionSerializer to create the final nested structure.
     sections = SectionSerializer(many=True, read_only=True)
-    saved_time_remaining=serializers.SerializerMethodField()
     class Meta:
         model = Test
-        fields = ['id', 'title', 'duration_minutes', 'sections','saved_time_remaining']
-    
-    def get_saved_time_remaining(self, obj):
-        user = self.context.get('request').user
-        if user and user.is_authenticated:
-            active_attempt = TestResult.objects.filter(user=user, test=obj, is_completed=False).first()
-            if active_attempt:
-                return active_attempt.time_remaining
-            return None
+        fields = ['id', 'title', 'duration_minutes', 'sections']
 
 
 from .models import UserResponse
@@ -126,7 +105,7 @@ class UserResponseSerializer(serializers.ModelSerializer):
         model = UserResponse
         fields = ['user', 'test', 'question', 'selected_answer', 'marked_for_review']
 
-class QuestionResultSerializer(serializers.ModelSerializer):
+class QuestionResultSerializer(LanguageProjectionMixin, serializers.ModelSerializer):
     class Meta:
         model = Question
         fields = [
@@ -313,7 +292,7 @@ class TestResultDetailSerializer(serializers.ModelSerializer):
     percentile=serializers.SerializerMethodField()
     # section wise breakdown
     section_analysis = serializers.SerializerMethodField()
-    responses = UserResponseDetailSerializer(many=True, read_only=True)
+    responses = serializers.SerializerMethodField()
     class Meta:
         model = TestResult
         fields = [
@@ -324,46 +303,34 @@ class TestResultDetailSerializer(serializers.ModelSerializer):
             'responses', 'marks_correct', 'marks_incorrect', 'percentile'
         ]
         
+    # Stored summary when present, else counted from rows or the packed sheet (see core/answersheets.py)
     def get_total_questions(self, obj):
-        return obj.responses.count()
+        return sheet_counts(obj)["total"]
     
     def get_correct_count(self, obj):
-        return obj.responses.filter(is_correct=True).count()
+        return sheet_counts(obj)["correct"]
 
     def get_incorrect_count(self, obj):
         # Incorrect = Answered but is_correct is False
-        return obj.responses.filter(is_correct=False).exclude(selected_answer__isnull=True).count()
+        return sheet_counts(obj)["incorrect"]
 
     def get_unanswered_count(self, obj):
-        return obj.responses.filter(selected_answer__isnull=True).count()
+        return sheet_counts(obj)["unanswered"]
 
     def get_accuracy(self, obj):
-        total_attempted = obj.responses.exclude(selected_answer__isnull=True).count()
-        correct = obj.responses.filter(is_correct=True).count()
-        if total_attempted > 0:
-            return round((correct / total_attempted) * 100, 2)
-        return 0
+        if obj.accuracy is not None:
+            return float(obj.accuracy)
+        return accuracy(sheet_counts(obj))
+
+    def get_responses(self, obj):
+        # The view may narrow the question columns (?lang=) through the context
+        responses = get_responses(obj, self.context.get('question_queryset'))
+        return UserResponseDetailSerializer(responses, many=True, context=self.context).data
 
     def get_percentile(self, obj):
         # 'obj' is the current TestResult (for the current user)
-        
-        # A. Get all COMPLETED results for this specific Test ID
-        # We only care about people who actually finished the test
-        all_attempts = TestResult.objects.filter(test=obj.test, is_completed=True)
-        best_attempts = all_attempts.order_by('user', '-score').distinct('user')
-        
-        total_students = best_attempts.count()
-        
-        if total_students <= 1:
-            return 100.00 # If you are the only one, you are top 100%
-
-        # B. Count how many people scored LESS than the current user
-        # 'score__lt' means "Score Less Than"
-        students_behind = sum(1 for attempt in best_attempts if attempt.score < obj.score)
-        
-        # 4. Formula
-        percentile_val = (students_behind / total_students) * 100
-        return round(percentile_val, 2)
+        # From the cached histogram of everyone's best score on the test (core/percentiles.py)
+        return percentile_for(obj.test_id, obj.score)
 
 
     def get_section_analysis(self, obj):
@@ -371,17 +338,15 @@ class TestResultDetailSerializer(serializers.ModelSerializer):
         
         # 1. Get all sections for this test
         sections = obj.test.sections.all()
+
+        # 2. {section_id: (attempted, correct)}, stored at submit time (or one grouped query for old results)
+        tally = section_tally(obj)
         
         for section in sections:
-            # 2. Filter user responses belonging to this section
-            # We use double underscore: question__section
-            section_responses = obj.responses.filter(question__section=section)
-            
             # 3. Calculate Stats
             total = section.number_of_questions
-            attempted = section_responses.exclude(selected_answer__isnull=True).count()
-            correct = section_responses.filter(is_correct=True).count()
-            incorrect = section_responses.filter(is_correct=False).exclude(selected_answer__isnull=True).count()
+            attempted, correct = tally.get(section.id, (0, 0))
+            incorrect = attempted - correct
             skipped = total - attempted
             
             accuracy = 0
@@ -446,7 +411,7 @@ class LeaderboardSerializer(serializers.ModelSerializer):
     rank = serializers.IntegerField(read_only=True) 
 
     class Meta:
-        model = TestResult
+        model = LeaderboardEntry
         # Only send what is needed for the table
         fields = ['rank','student_name', 'score', 'accuracy', 'time_remaining', 'completed_at']
 
@@ -456,9 +421,17 @@ class LeaderboardSerializer(serializers.ModelSerializer):
         return f"{obj.user.first_name} {obj.user.last_name}".strip() or obj.user.email.split('@')[0]
 
     def get_accuracy(self, obj):
-        # Calculate accuracy on the fly
-        total_attempted = obj.responses.exclude(selected_answer__isnull=True).count()
-        if total_attempted == 0:
-            return 0.0
-        correct = obj.responses.filter(is_correct=True).count()
-        return round((correct / total_attempted) * 100, 1)
\ No newline at end of file
+        # Stored on the entry when the attempt was graded
+        return round(float(obj.accuracy), 1)
+
+
+class AggregateScoreSerializer(serializers.ModelSerializer):
+    student_name = serializers.SerializerMethodField()
+    rank = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = AggregateScore
+        fields = ['rank', 'student_name', 'tests_taken', 'total_score', 'average_score']
+
+    def get_student_name(self, obj):
+        return f"{obj.user.first_name} {obj.user.last_name}".strip() or obj.user.email.split('@')[0]
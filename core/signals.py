@@ -0,0 +1,34 @@
+# core/signals.py
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .aggregates import delete_scope
+from .models import ExamName, Test, TestSeries, Section, Question
+
+
+def bump_paper_version(**filters):
+    """Stamps a new paper_version on the matching test so cached snapshots are skipped.
+    Note: queryset.update() and bulk_create() do not send signals, so code using
+    them on Sections/Questions has to call this itself."""
+    Test.objects.filter(**filters).update(paper_version=F('paper_version') + 1)
+
+
+@receiver([post_save, post_delete], sender=Section)
+def section_changed(sender, instance, **kwargs):
+    bump_paper_version(pk=instance.test_id)
+
+
+@receiver([post_save, post_delete], sender=Question)
+def question_changed(sender, instance, **kwargs):
+    bump_paper_version(sections__id=instance.section_id)
+
+
+# AggregateScore.scope_id is not a foreign key, so nothing cascades to it
+@receiver(post_delete, sender=TestSeries)
+def series_deleted(sender, instance, **kwargs):
+    delete_scope('series', instance.pk)
+
+
+@receiver(post_delete, sender=ExamName)
+def exam_deleted(sender, instance, **kwargs):
+    delete_scope('exam', instance.pk)
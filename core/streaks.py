@@ -0,0 +1,68 @@
+# core/streaks.py
+"""
+Daily practice streaks, stored on the user (current_streak, longest_streak,
+last_active_date).
+
+finalize_submission calls record_activity() with the day of the attempt; that
+is one conditional UPDATE (two on a broken streak), with no read of the
+user's history. A stored streak is only extended by activity, so missed days
+are applied when it is read: streak_for() reports 0 once last_active_date is
+older than yesterday. Days are in the current time zone, like TruncDate.
+`rebuild_streaks` recomputes the columns from the DailyActivity rows (one
+indexed read of active days per user, see core/activity.py), so
+`rebuild_daily_activity` has to run before it when those need rebuilding too.
+"""
+from datetime import timedelta
+
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import CustomUser, DailyActivity
+
+
+def record_activity(user_id, day):
+    """Counts `day` as an active day of the user (no-op when it already is)."""
+    users = CustomUser.objects.filter(pk=user_id)
+    # 1. Active yesterday: the streak goes on
+    if users.filter(last_active_date=day - timedelta(days=1)).update(
+        current_streak=F('current_streak') + 1,
+        longest_streak=Greatest(F('longest_streak'), F('current_streak') + 1),
+        last_active_date=day,
+    ):
+        return
+    # 2. First activity, or a gap: a new streak starts (unless today is already counted)
+    users.exclude(last_active_date__gte=day).update(
+        current_streak=1,
+        longest_streak=Greatest(F('longest_streak'), Value(1)),
+        last_active_date=day,
+    )
+
+
+def streak_for(user, today=None):
+    """The user's current streak, as of `today` (default: the current date)."""
+    today = today or timezone.localdate()
+    if user.last_active_date is None or user.last_active_date < today - timedelta(days=1):
+        return 0
+    return user.current_streak
+
+
+def rebuild_streaks(user_ids):
+    """Recomputes the streak columns of `user_ids` from their active days (DailyActivity)."""
+    days = {user_id: [] for user_id in user_ids}
+    for user_id, day in (
+        DailyActivity.objects.filter(user_id__in=user_ids, tests_taken__gt=0)
+        .values_list('user_id', 'day').order_by('user_id', 'day')
+    ):
+        days[user_id].append(day)
+
+    users = []
+    for user_id, active_days in days.items():
+        current = longest = 0
+        previous = None
+        for day in active_days:
+            current = current + 1 if previous == day - timedelta(days=1) else 1
+            longest = max(longest, current)
+            previous = day
+        users.append(CustomUser(pk=user_id, current_streak=current, longest_streak=longest, last_active_date=previous))
+    CustomUser.objects.bulk_update(users, ['current_streak', 'longest_streak', 'last_active_date'], batch_size=1000)
@@ -0,0 +1,203 @@
+# core/submissions.py
+"""
+Turning an in-progress attempt into a graded result.
+
+`finalize_submission` is the single place a submission is graded and
+persisted. SubmitTestView calls it directly (sync mode) or enqueues a
+PendingSubmission that a `process_submissions` worker hands to it later
+(async mode, settings.ASYNC_SUBMISSIONS, for the end-of-test rush).
+
+An attempt is graded at most once: finalize_submission re-reads is_completed
+under the attempt's row lock and leaves a completed attempt alone, and a
+retried async submit gets the submission already queued for the attempt.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .activity import record_day
+from .answersheets import graded_sections, pack_sheet, packed_storage_enabled, store_summary
+from .autosave import autosave_buffered, buffered_answers, close_buffer, get_buffered
+from .grading import align_answers, get_answer_key, grade
+from .leaderboard import record_attempt
+from .models import CustomUser, Notification, PendingSubmission, TestResult, UserResponse
+from .streaks import record_activity
+from .userstats import record_result
+
+MAX_ATTEMPTS = 3
+# A PROCESSING row older than this belongs to a worker that died; it is claimed again
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+
+def get_or_create_attempt(user, test):
+    test_result = TestResult.objects.filter(
+        user=user, 
+        test=test, 
+        is_completed=False
+    ).last()
+
+    if not test_result:
+        test_result = TestResult.objects.create(
+            user=user, 
+            test=test, 
+            is_completed=False,
+            score=0
+        )
+    return test_result
+
+
+@transaction.atomic
+def finalize_submission(test_result, answers, submitted_at=None):
+    """Grades `answers` and turns `test_result` into a completed result.
+    `submitted_at` (default: now) becomes its completed_at; queued submissions pass their enqueue time."""
+    test = test_result.test
+    user = test_result.user
+
+    # Cached per paper_version, so this normally costs no query
+    answer_key = get_answer_key(test)
+
+    # Lock the attempt: autosaves (HTTP, exam socket, flush_autosaves) and other submits wait for
+    # this transaction and then find it completed, instead of writing into the graded sheet
+    state = list(TestResult.objects.select_for_update().filter(pk=test_result.pk).values_list('is_completed', flat=True))
+    if state != [False]:
+        # Already graded by a concurrent or retried submit (or removed by one): nothing to do
+        if state:
+            test_result.refresh_from_db()
+        return test_result
+
+    # Autosaves not flushed from the write-behind buffer yet; the submitted sheet wins
+    buffered = get_buffered(test_result.id)
+    if buffered:
+        answers = buffered_answers(buffered) + list(answers)
+    if autosave_buffered():
+        transaction.on_commit(lambda: close_buffer(test_result.id))
+
+    # Grade the whole sheet in one pass (same engine as regrades)
+    selected, marked = align_answers(answer_key, answers)
+    sheet = grade(answer_key, selected, marked, test.marks_correct, test.marks_incorrect)
+    score = sheet.score
+
+    # 1. Delete old responses (autosaves) for this result to avoid duplicates
+    UserResponse.objects.filter(test_result=test_result).delete()
+
+    # 2. Store the graded sheet: packed into the result itself, or one row per question
+    if packed_storage_enabled():
+        pack_sheet(test_result, answer_key.question_ids, sheet.selected, sheet.correct, sheet.marked)
+    else:
+        UserResponse.objects.bulk_create([
+            UserResponse(
+                test_result=test_result,
+                question_id=question_id,
+                selected_answer=selected_answer,
+                marked_for_review=marked_for_review,
+                is_correct=is_correct
+            )
+            for question_id, selected_answer, marked_for_review, is_correct
+            in zip(answer_key.question_ids, sheet.selected, sheet.marked, sheet.correct)
+        ])
+
+    # 3. Cleanup other incomplete attempts for this test/user
+    TestResult.objects.filter(
+        user=user, 
+        test=test, 
+        is_completed=False
+    ).exclude(id=test_result.id).delete()
+
+    # 4. Finalize Test Result
+    test_result.score = score
+    store_summary(
+        test_result, sheet.correct_count, sheet.incorrect_count, sheet.unanswered_count, graded_sections(sheet)
+    )
+    test_result.is_completed = True
+    test_result.time_remaining = 0
+    # completed_at was filled when the attempt was opened (auto_now_add); it is the submission time from here on
+    test_result.completed_at = submitted_at or timezone.now()
+    test_result.save()
+
+    # 5. Leaderboard keeps each user's best attempt
+    record_attempt(test_result)
+    # 6. Dashboard totals, practice streak and activity calendar. The user's row lock is the one
+    # the rollup rebuilds take, so a rebuild never reads around this submission and then overwrites it
+    list(CustomUser.objects.select_for_update().filter(pk=test_result.user_id).values_list('id', flat=True))
+    record_result(test_result)
+    record_activity(test_result.user_id, timezone.localdate(test_result.completed_at))
+    record_day(test_result)
+
+    Notification.objects.create(
+        user=user,
+        title="Test Result Published",
+        message=f"You scored {score} in {test.title}. Check your detailed analysis now.",
+        notification_type="RESULT"
+    )
+    return test_result
+
+
+def enqueue_submission(test_result, answers):
+    """Stores the raw answer sheet; grading happens later in a worker.
+    A retried submit of an attempt that is still queued returns the queued submission."""
+    # The attempt's row lock keeps two concurrent submits from both finding nothing queued
+    list(TestResult.objects.select_for_update().filter(pk=test_result.pk).values_list('id', flat=True))
+    queued = PendingSubmission.objects.filter(test_result=test_result, status__in=('PENDING', 'PROCESSING')).first()
+    if queued is not None:
+        return queued
+    return PendingSubmission.objects.create(test_result=test_result, answers=answers)
+
+
+def claim_pending(batch_size):
+    """Marks up to `batch_size` queued submissions as PROCESSING and returns them.
+    Uses SKIP LOCKED where the database supports it, so several workers can run at once."""
+    stale = timezone.now() - CLAIM_TIMEOUT
+    with transaction.atomic():
+        batch = list(
+            PendingSubmission.objects.select_for_update(skip_locked=True, of=('self',))
+            .filter(Q(status='PENDING') | Q(status='PROCESSING', claimed_at__lt=stale))
+            .select_related('test_result__test', 'test_result__user')[:batch_size]
+        )
+        PendingSubmission.objects.filter(id__in=[p.id for p in batch]).update(
+            status='PROCESSING', claimed_at=timezone.now()
+        )
+    return batch
+
+
+def process_submission(pending):
+    """Grades one queued submission; failures are retried up to MAX_ATTEMPTS times."""
+    close_old_connections()
+    pending.attempts += 1
+    try:
+        # Cheap skip for a result graded before this was claimed; finalize_submission
+        # re-checks under the row lock, so duplicates racing each other are safe too
+        if not pending.test_result.is_completed:
+            finalize_submission(pending.test_result, pending.answers, submitted_at=pending.created_at)
+    except Exception as e:
+        pending.status = 'FAILED' if pending.attempts >= MAX_ATTEMPTS else 'PENDING'
+        pending.error = str(e)
+    else:
+        pending.status = 'DONE'
+        pending.error = ''
+    pending.processed_at = timezone.now()
+    pending.save(update_fields=['status', 'attempts', 'error', 'processed_at'])
+    return pending.status
+
+
+def process_pending(batch_size=50, workers=1):
+    """Claims one batch and grades it on a local thread pool. Returns how many were claimed."""
+    batch = claim_pending(batch_size)
+    if workers > 1 and len(batch) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(_process_in_thread, batch))
+    else:
+        for pending in batch:
+            process_submission(pending)
+    return len(batch)
+
+
+def _process_in_thread(pending):
+    from django.db import connection
+    try:
+        return process_submission(pending)
+    finally:
+        # Each thread has its own connection; don't leak it
+        connection.close()
@@ -1,3 +1,930 @@
-from django.test import TestCase
+import gzip
+import json
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .activity import rebuild_daily_activity
+from .aggregates import rebuild_scope
+from .answersheets import SUMMARY_FIELDS, section_tally, sheet_counts
+from .autosave import DIRTY_NEXT_KEY, AttemptClosed, buffer_progress, flush_buffer, get_buffered, save_progress
+from .blobs import JsonBlob, accepts_gzip
+from .checks import check_autosave_cache
+from .examsocket import CLOSE_SUBMITTED, CLOSE_UNAUTHORIZED, exam_session
+from .grading import get_answer_key
+from .leaderboard import RANK_ORDER, ahead_of, behind, rank_of, rebuild_test_leaderboard
+from .models import AggregateScore, CustomUser, DailyActivity, LeaderboardEntry, ExamName, PendingSubmission, TestSeries, Test, Section, Question, TestResult, UserStats
+from .papers import paper_cache_key
+from .percentiles import HISTOGRAM_BUCKETS, PERCENTILE_MAX_AGE, distribution_cache_key, get_distribution, percentile_for
+from .streaks import rebuild_streaks, record_activity, streak_for
+from .submissions import finalize_submission, get_or_create_attempt, process_pending
+
+
+def make_test(num_sections=1, questions_per_section=1, **kwargs):
+    exam, _ = ExamName.objects.get_or_create(name='SSC')
+    series, _ = TestSeries.objects.get_or_create(name='SSC CGL', description='CGL mocks', category=exam)
+    test = Test.objects.create(title='Mock 1', duration_minutes=60, test_series=series, is_published=True, **kwargs)
+    for s in range(num_sections):
+        section = Section.objects.create(name=f'Section {s + 1}', number_of_questions=questions_per_section, test=test)
+        for q in range(questions_per_section):
+            Question.objects.create(
+                section=section,
+                question_text=f'Question {s + 1}.{q + 1}',
+                option_a='A', option_b='B', option_c='C', option_d='D',
+                correct_option='abcd'[q % 4],
+            )
+    test.refresh_from_db()
+    return test
+
+
+def make_user(email='student@example.com', **kwargs):
+    kwargs.setdefault('is_pro_member', True)
+    return CustomUser.objects.create_user('Test', 'Student', email, email.split('@')[0], 'pass', **kwargs)
+
+
+class TestDetailQueryBudgetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(make_user())
+
+    def count_queries(self, test):
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/api/tests/{test.id}/')
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_sections(self):
+        small = make_test(num_sections=1, questions_per_section=2)
+        large = make_test(num_sections=5, questions_per_section=10)
+        self.assertEqual(self.count_queries(small), self.count_queries(large))
+
+    def test_cold_paper_budget(self):
+        test = make_test(num_sections=4, questions_per_section=5)
+        # test, sections, questions, ongoing attempt
+        with self.assertNumQueries(4):
+            response = self.client.get(f'/api/tests/{test.id}/')
+        self.assertEqual(len(response.json()['sections']), 4)
+        self.assertIsNone(response.json()['saved_time_remaining'])
+
+    def test_cached_paper_skips_paper_queries(self):
+        test = make_test(num_sections=4, questions_per_section=5)
+        self.client.get(f'/api/tests/{test.id}/')
+        # test, ongoing attempt
+        with self.assertNumQueries(2):
+            self.client.get(f'/api/tests/{test.id}/')
+
+    def test_edits_replace_the_served_paper(self):
+        test = make_test(num_sections=1, questions_per_section=2)
+        url = f'/api/tests/{test.id}/'
+        self.client.get(url)
+        question = Question.objects.filter(section__test=test).order_by('id').first()
+        section = question.section
+        version = test.paper_version
+
+        question.question_text = 'Edited question'
+        question.save()
+        section.name = 'Renamed section'
+        section.save()
+        test.refresh_from_db()
+        test.title = 'Renamed mock'
+        test.save()
+
+        # Each save bumped the version once, so the next read builds a new snapshot
+        self.assertEqual(Test.objects.get(pk=test.pk).paper_version, version + 3)
+        paper = self.client.get(url).json()
+        self.assertEqual(paper['title'], 'Renamed mock')
+        self.assertEqual(paper['sections'][0]['name'], 'Renamed section')
+        self.assertEqual(paper['sections'][0]['questions'][0]['question_text'], 'Edited question')
+
+
+class PaperLanguageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(make_user())
+        self.test = make_test(num_sections=1, questions_per_section=2)
+
+    def get_paper(self, lang):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/api/tests/{self.test.id}/', {'lang': lang})
+        question_sql = [q['sql'] for q in ctx.captured_queries if 'FROM "core_question"' in q['sql']]
+        return response, question_sql
+
+    def test_each_language_loads_and_sends_only_its_columns(self):
+        english = Question.language_columns('en', explanation=False)
+        hindi = Question.language_columns('hi', explanation=False)
+        for lang, kept, dropped in (('en', english, hindi), ('hi', hindi, english)):
+            response, question_sql = self.get_paper(lang)
+            question = response.json()['sections'][0]['questions'][0]
+            for field in kept:
+                self.assertIn(field, question)
+            for field in dropped:
+                self.assertNotIn(field, question)
+            # Deferred through only(): the other language's columns are not even selected
+            self.assertEqual(len(question_sql), 1)
+            for field in dropped:
+                self.assertNotIn(f'"core_question"."{field}"', question_sql[0])
+
+        # One snapshot per language; a cached language is not rebuilt
+        self.assertIsNotNone(cache.get(paper_cache_key(self.test, 'en')))
+        self.assertIsNotNone(cache.get(paper_cache_key(self.test, 'hi')))
+        self.assertEqual(self.get_paper('en')[1], [])
+        self.assertIn('question_text_hi', self.get_paper('both')[0].json()['sections'][0]['questions'][0])
+
+    def test_unknown_language_is_rejected(self):
+        self.assertEqual(self.client.get(f'/api/tests/{self.test.id}/', {'lang': 'xx'}).status_code, 400)
+
+
+class PaperManifestTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(make_user())
+
+    def test_manifest_then_sections(self):
+        test = make_test(num_sections=3, questions_per_section=4)
+        manifest = self.client.get(f'/api/tests/{test.id}/manifest/').json()
+        self.assertEqual(manifest['total_questions'], 12)
+        self.assertEqual([s['question_count'] for s in manifest['sections']], [4, 4, 4])
+        self.assertNotIn('questions', manifest['sections'][0])
+
+        section_id = manifest['sections'][1]['id']
+        section = self.client.get(f'/api/tests/{test.id}/sections/{section_id}/').json()
+        self.assertEqual(section['name'], 'Section 2')
+        self.assertEqual(len(section['questions']), 4)
+        # Cached per paper version: no paper queries on the second read
+        with self.assertNumQueries(1):  # test lookup
+            self.client.get(f'/api/tests/{test.id}/sections/{section_id}/')
+
+        other = make_test()
+        self.assertEqual(self.client.get(f'/api/tests/{other.id}/sections/{section_id}/').status_code, 404)
+
+
+class JsonBlobTests(TestCase):
+    def test_gzip_with_extra_fields_round_trips(self):
+        blob = JsonBlob({'title': 'Mock 1', 'sections': [{'name': 'गणित'}]})
+        extra = {'saved_time_remaining': 120, 'saved_responses': []}
+        expected = {'title': 'Mock 1', 'sections': [{'name': 'गणित'}], **extra}
+        self.assertEqual(json.loads(blob.render(extra)), expected)
+        self.assertEqual(json.loads(gzip.decompress(blob.render_gzip(extra))), expected)
+        self.assertNotEqual(blob.etag(extra), blob.etag())
+
+    def test_paper_conditional_get(self):
+        test = make_test(num_sections=2, questions_per_section=2)
+        client = APIClient()
+        client.force_authenticate(make_user())
+        first = client.get(f'/api/tests/{test.id}/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(first['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(first.content))['sections']), 2)
+        again = client.get(f'/api/tests/{test.id}/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+    def test_gzip_refused_with_zero_quality(self):
+        self.assertTrue(accepts_gzip('gzip, deflate, br'))
+        self.assertTrue(accepts_gzip('br;q=1.0, *;q=0.5'))
+        self.assertFalse(accepts_gzip('gzip;q=0, deflate'))
+        self.assertFalse(accepts_gzip('*;q=0.5, gzip;q=0'))
+        self.assertFalse(accepts_gzip('identity'))
+
+
+class AutosaveTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(make_user())
+
+    def save(self, test, answers, time_remaining=600, **extra):
+        responses = [{'question_id': q, 'selected_answer': a} for q, a in answers.items()]
+        return self.client.post(
+            f'/api/tests/{test.id}/save-progress/',
+            {'time_remaining': time_remaining, 'responses': responses, **extra},
+            format='json',
+        )
+
+    def test_autosave_upserts_in_constant_queries(self):
+        small = make_test(num_sections=1, questions_per_section=2)
+        large = make_test(num_sections=2, questions_per_section=20)
+        for test in (small, large):
+            question_ids = list(Question.objects.filter(section__test=test).values_list('id', flat=True))
+            self.save(test, {q: 'a' for q in question_ids})
+            # attempt lookup, timer update, upsert (+ savepoint in/out, as TestCase is already in a transaction)
+            with self.assertNumQueries(5):
+                self.save(test, {q: 'b' for q in question_ids}, time_remaining=500)
+
+        result = TestResult.objects.get(test=large, is_completed=False)
+        self.assertEqual(result.time_remaining, 500)
+        self.assertEqual(result.responses.count(), 40)
+        self.assertEqual(set(result.responses.values_list('selected_answer', flat=True)), {'b'})
+
+    def test_delta_saves_merge_and_drop_stale_seq(self):
+        test = make_test(num_sections=1, questions_per_section=3)
+        q1, q2, q3 = Question.objects.filter(section__test=test).values_list('id', flat=True)
+        self.assertEqual(self.save(test, {q1: 'a', q2: 'b'}, 590, seq=1).json()['status'], 'saved')
+        self.assertEqual(self.save(test, {q2: 'c'}, 580, seq=3).json()['status'], 'saved')
+        # seq 2 arrives late and must not overwrite seq 3
+        self.assertEqual(self.save(test, {q2: 'd', q3: 'd'}, 585, seq=2).json()['status'], 'stale')
+        for bad_seq in (2 ** 31, -1, 'x'):
+            self.assertEqual(self.save(test, {q3: 'd'}, 570, seq=bad_seq).status_code, 400)
+
+        progress = self.client.get(f'/api/tests/{test.id}/').json()
+        self.assertEqual(progress['saved_time_remaining'], 580)
+        self.assertEqual(progress['saved_seq'], 3)
+        saved = {r['question_id']: r['selected_answer'] for r in progress['saved_responses']}
+        self.assertEqual(saved, {q1: 'a', q2: 'c'})
+
+    def test_save_after_submit_is_refused(self):
+        test = make_test(num_sections=1, questions_per_section=2)
+        q1, q2 = Question.objects.filter(section__test=test).values_list('id', flat=True)
+        self.save(test, {q1: 'a'}, 590, seq=1)
+        result = TestResult.objects.get(test=test)
+        finalize_submission(result, [{'question_id': q1, 'selected_answer': 'a'}])
+
+        # A save that looked the attempt up before the submit and writes after it
+        with self.assertRaises(AttemptClosed):
+            save_progress(result, 300, [{'question_id': q1, 'selected_answer': 'b'}, {'question_id': q2}], seq=2)
+        result.refresh_from_db()
+        self.assertEqual((result.time_remaining, result.autosave_seq), (0, 1))
+        self.assertEqual(dict(result.responses.values_list('question_id', 'selected_answer')), {q1: 'a', q2: None})
+
+
+@override_settings(AUTOSAVE_MODE='buffered', AUTOSAVE_ALLOW_LOCAL_CACHE=True)
+class AutosaveBufferTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(make_user())
+        self.test = make_test(num_sections=1, questions_per_section=3)
+        self.q1, self.q2, self.q3 = Question.objects.filter(section__test=self.test).values_list('id', flat=True)
+
+    def save(self, answers, time_remaining, seq):
+        responses = [{'question_id': q, 'selected_answer': a} for q, a in answers.items()]
+        return self.client.post(
+            f'/api/tests/{self.test.id}/save-progress/',
+            {'time_remaining': time_remaining, 'responses': responses, 'seq': seq}, format='json',
+        )
+
+    def test_buffered_saves_are_read_through_and_flushed(self):
+        self.save({self.q1: 'a'}, 590, seq=1)
+        self.save({self.q2: 'b'}, 580, seq=2)
+        result = TestResult.objects.get(test=self.test)
+        self.assertEqual(result.responses.count(), 0)
+
+        progress = self.client.get(f'/api/tests/{self.test.id}/').json()
+        self.assertEqual(progress['saved_time_remaining'], 580)
+        self.assertEqual(progress['saved_seq'], 2)
+        self.assertEqual(len(progress['saved_responses']), 2)
+
+        self.assertEqual(flush_buffer(), (2, 1))
+        result.refresh_from_db()
+        self.assertEqual((result.time_remaining, result.autosave_seq), (580, 2))
+        self.assertEqual(dict(result.responses.values_list('question_id', 'selected_answer')), {self.q1: 'a', self.q2: 'b'})
+
+    def test_submit_reads_buffered_answers(self):
+        self.save({self.q1: 'a', self.q2: 'a'}, 590, seq=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f'/api/tests/{self.test.id}/submit/',
+                {'responses': [{'question_id': self.q2, 'selected_answer': 'b'}]}, format='json',
+            )
+        # q1 from the buffer (correct 'a'), q2 from the submitted sheet (correct 'b')
+        self.assertEqual(response.json()['correct_count'], 2)
+        self.assertEqual(response.json()['unanswered_count'], 1)
+        self.assertEqual(flush_buffer()[1], 0)
+
+        # The submitted attempt's entry is closed, so a late save can't bring it back
+        result = TestResult.objects.get(test=self.test)
+        with self.assertRaises(AttemptClosed):
+            buffer_progress(result, 300, [{'question_id': self.q3, 'selected_answer': 'c'}], seq=2)
+        self.assertIsNone(get_buffered(result.id))
+
+    def test_locked_entry_is_not_overwritten(self):
+        self.save({self.q1: 'a'}, 590, seq=1)
+        result = TestResult.objects.get(test=self.test)
+        # Another worker is in the middle of a save of this attempt
+        cache.add(f'autosave:lock:{result.id}', 'other', 5)
+        with mock.patch('core.autosave.LOCK_WAIT', 0):
+            busy = self.save({self.q2: 'b'}, 580, seq=2)
+        self.assertEqual((busy.status_code, busy['Retry-After']), (503, '1'))
+        cache.delete(f'autosave:lock:{result.id}')
+        self.assertEqual(self.save({self.q2: 'b'}, 580, seq=2).json()['status'], 'saved')
+        self.assertEqual(set(get_buffered(result.id)['answers']), {self.q1, self.q2})
+
+    def test_lost_slot_counter_does_not_hide_saves(self):
+        self.save({self.q1: 'a'}, 590, seq=1)
+        self.assertEqual(flush_buffer(), (1, 1))
+        cache.delete(DIRTY_NEXT_KEY)  # evicted
+        self.save({self.q2: 'b'}, 580, seq=2)
+        self.assertEqual(flush_buffer(), (1, 1))
+        result = TestResult.objects.get(test=self.test)
+        self.assertEqual((result.time_remaining, result.responses.count()), (580, 2))
+
+    @override_settings(AUTOSAVE_ALLOW_LOCAL_CACHE=False)
+    def test_per_process_cache_is_refused(self):
+        self.assertEqual([e.id for e in check_autosave_cache(None)], ['core.E001'])
+        with self.assertRaises(ImproperlyConfigured):
+            self.save({self.q1: 'a'}, 590, seq=1)
+
+
+class ExamSocketTests(TransactionTestCase):
+    """The live session socket, driven through the ASGI app.
+    TransactionTestCase: the socket releases its DB connection between messages like a request would."""
+
+    def setUp(self):
+        self.user = make_user()
+        self.test = make_test(num_sections=1, questions_per_section=2)
+        self.q1, self.q2 = Question.objects.filter(section__test=self.test).values_list('id', flat=True)
+
+    def connect(self, token=None):
+        token = token or str(RefreshToken.for_user(self.user).access_token)
+        return ApplicationCommunicator(exam_session, {
+            'type': 'websocket', 'path': f'/ws/tests/{self.test.id}/session/',
+            'query_string': f'token={token}'.encode(),
+        })
+
+    @staticmethod
+    async def open(socket):
+        await socket.send_input({'type': 'websocket.connect'})
+        accepted = await socket.receive_output()
+        ready = await socket.receive_output()
+        return accepted, json.loads(ready['text'])
+
+    @staticmethod
+    async def send(socket, *messages):
+        for message in messages:
+            await socket.send_input({'type': 'websocket.receive', 'text': json.dumps(message)})
+
+    def test_bad_token_is_closed(self):
+        async def scenario():
+            socket = self.connect(token='not-a-jwt')
+            await socket.send_input({'type': 'websocket.connect'})
+            return await socket.receive_output()
+
+        self.assertEqual(async_to_sync(scenario)(), {'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED})
+
+    def test_deltas_are_saved_on_flush(self):
+        async def scenario():
+            socket = self.connect()
+            accepted, ready = await self.open(socket)
+            await self.send(
+                socket,
+                {'type': 'answer', 'question_id': self.q1, 'selected_answer': 'a', 'seq': 1},
+                {'type': 'answer', 'question_id': self.q1, 'selected_answer': 'c', 'seq': 2},
+                {'type': 'tick', 'time_remaining': 1700, 'seq': 3},
+                {'type': 'flush'},
+            )
+            saved = json.loads((await socket.receive_output())['text'])
+            # Sent again with an old seq (e.g. a reconnecting client replaying its queue)
+            await self.send(socket, {'type': 'answer', 'question_id': self.q2, 'selected_answer': 'b', 'seq': 2})
+            await self.send(socket, {'type': 'flush'})
+            stale = json.loads((await socket.receive_output())['text'])
+            await socket.send_input({'type': 'websocket.disconnect', 'code': 1000})
+            await socket.wait(timeout=1)
+            return accepted, ready, saved, stale
+
+        accepted, ready, saved, stale = async_to_sync(scenario)()
+        self.assertEqual(accepted, {'type': 'websocket.accept'})
+        self.assertEqual((ready['type'], ready['seq'], ready['time_remaining']), ('ready', 0, 3600))
+        self.assertEqual(saved, {'type': 'saved', 'seq': 3})
+        self.assertEqual(stale, {'type': 'stale', 'seq': 2})
+        result = TestResult.objects.get(pk=ready['result_id'])
+        self.assertEqual((result.time_remaining, result.autosave_seq), (1700, 3))
+        self.assertEqual(dict(result.responses.values_list('question_id', 'selected_answer')), {self.q1: 'c'})
+
+    def test_writes_after_submit_close_the_socket(self):
+        async def scenario():
+            socket = self.connect()
+            _, ready = await self.open(socket)
+            # The attempt is submitted over HTTP while the socket is open
+            await sync_to_async(self.submit)(ready['result_id'])
+            await self.send(
+                socket,
+                {'type': 'answer', 'question_id': self.q2, 'selected_answer': 'b', 'seq': 1},
+                {'type': 'flush'},
+            )
+            error = json.loads((await socket.receive_output())['text'])
+            closed = await socket.receive_output()
+            await socket.wait(timeout=1)
+            return ready, error, closed
+
+        ready, error, closed = async_to_sync(scenario)()
+        self.assertEqual(error, {'type': 'error', 'error': 'submitted'})
+        self.assertEqual(closed, {'type': 'websocket.close', 'code': CLOSE_SUBMITTED})
+        result = TestResult.objects.get(pk=ready['result_id'])
+        self.assertTrue(result.is_completed)
+        self.assertEqual(result.autosave_seq, 0)
+        self.assertEqual(dict(result.responses.values_list('question_id', 'selected_answer')), {self.q1: 'a', self.q2: None})
+
+    def submit(self, result_id):
+        finalize_submission(TestResult.objects.get(pk=result_id), [{'question_id': self.q1, 'selected_answer': 'a'}])
+
+
+def finish_attempt(user, test, answer):
+    """Submits `answer` for every question of `test`, without going through the API."""
+    answers = [
+        {'question_id': q, 'selected_answer': answer}
+        for q in Question.objects.filter(section__test=test).values_list('id', flat=True)
+    ]
+    return finalize_submission(get_or_create_attempt(user, test), answers)
+
+
+class ResultSummaryTests(TestCase):
+    def test_summary_stored_at_submit_matches_backfill(self):
+        test = make_test(num_sections=2, questions_per_section=4)
+        result = finish_attempt(make_user(), test, 'a')  # 2 correct, 6 incorrect
+        summary = TestResult.objects.filter(pk=result.pk).values(*SUMMARY_FIELDS[:-1]).get()
+        self.assertEqual(summary, {
+            'total_questions': 8, 'correct_count': 2, 'incorrect_count': 6, 'unanswered_count': 0,
+            'attempted_count': 8, 'accuracy': Decimal('25.00'),
+        })
+        with self.assertNumQueries(0):
+            self.assertEqual(sheet_counts(result)['attempted'], 8)
+
+        TestResult.objects.update(**{field: None for field in SUMMARY_FIELDS})
+        call_command('backfill_result_summary', stdout=StringIO())
+        self.assertEqual(TestResult.objects.filter(pk=result.pk).values(*SUMMARY_FIELDS[:-1]).get(), summary)
+
+    def test_section_stats_match_grouped_rows(self):
+        test = make_test(num_sections=3, questions_per_section=4)
+        result = finish_attempt(make_user(), test, 'b')
+        with self.assertNumQueries(0):
+            stored = section_tally(result)
+        self.assertEqual(stored, {section.id: (4, 1) for section in test.sections.all()})
+
+        # Legacy result: one GROUP BY over its rows, whatever the number of sections
+        result.section_stats = None
+        with self.assertNumQueries(1):
+            self.assertEqual(section_tally(result), stored)
+
+        client = APIClient()
+        client.force_authenticate(result.user)
+        analysis = client.get(f'/api/results/{result.id}/').json()['section_analysis']
+        self.assertEqual([(s['attempted'], s['correct'], s['accuracy']) for s in analysis], [(4, 1, 25.0)] * 3)
+
+
+class LeaderboardTests(TestCase):
+    def test_leaderboard_keeps_best_attempt_per_user(self):
+        test = make_test(num_sections=1, questions_per_section=4, marks_incorrect=0)
+        alice, bob = make_user('alice@example.com'), make_user('bob@example.com')
+        finish_attempt(alice, test, 'b')   # 1 correct
+        finish_attempt(bob, test, 'a')     # 1 correct
+        finish_attempt(alice, test, None)  # worse, must not replace her best
+        finish_attempt(bob, test, 'c')     # 1 correct, not better
+
+        client = APIClient()
+        client.force_authenticate(alice)
+        with self.assertNumQueries(1):  # entries joined with their users
+            rows = client.get(f'/api/tests/{test.id}/leaderboard/').json()
+        self.assertEqual([r['rank'] for r in rows], [1, 2])
+        self.assertEqual([r['accuracy'] for r in rows], [25.0, 25.0])
+
+        rebuild_test_leaderboard(test.id)
+        self.assertEqual(client.get(f'/api/tests/{test.id}/leaderboard/').json(), rows)
+
+
+@override_settings(ASYNC_SUBMISSIONS=True)
+class AsyncSubmissionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.test = make_test(num_sections=1, questions_per_section=4)
+        self.student = make_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+        self.answers = [{'question_id': q, 'selected_answer': 'a'}
+                        for q in Question.objects.filter(section__test=self.test).values_list('id', flat=True)]
+
+    def submit(self):
+        return self.client.post(f'/api/tests/{self.test.id}/submit/', {'responses': self.answers}, format='json')
+
+    def test_queued_submission_is_graded_once(self):
+        queued = self.submit()
+        self.assertEqual(queued.status_code, 202)
+        poll = self.client.get(queued.json()['poll_url'])
+        self.assertEqual((poll.status_code, poll.json()['status']), (202, 'pending'))
+
+        self.assertEqual(process_pending(), 1)
+        self.assertEqual(process_pending(), 0)
+        graded = self.client.get(queued.json()['poll_url'])
+        self.assertEqual(graded.status_code, 200)
+        self.assertEqual(graded.json()['correct_count'], 1)
+        self.assertEqual(self.student.notifications.count(), 1)
+
+    def test_submitting_the_same_attempt_twice_grades_it_once(self):
+        # A client retry while the first submit is still queued
+        first, retry = self.submit(), self.submit()
+        self.assertEqual(first.json()['result_id'], retry.json()['result_id'])
+        self.assertEqual(PendingSubmission.objects.count(), 1)
+
+        # Duplicates queued anyway (or a second worker) find the attempt completed under its lock
+        result = TestResult.objects.get(pk=first.json()['result_id'])
+        PendingSubmission.objects.create(test_result=result, answers=self.answers)
+        self.assertEqual(process_pending(), 2)
+        self.assertEqual(finalize_submission(result, self.answers).pk, result.pk)
+
+        self.assertEqual(UserStats.objects.get(pk=self.student.pk).tests_taken, 1)
+        self.assertEqual(DailyActivity.objects.get(user=self.student).tests_taken, 1)
+        self.assertEqual(self.student.notifications.count(), 1)
+        self.assertEqual(result.responses.count(), 4)
+
+    @override_settings(ASYNC_SUBMISSIONS=False)
+    def test_clients_cannot_choose_async_mode(self):
+        response = self.client.post(
+            f'/api/tests/{self.test.id}/submit/?mode=async', {'responses': self.answers}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(PendingSubmission.objects.exists())
+
+
+class AnswerKeyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.test = make_test(num_sections=2, questions_per_section=4)
+        self.users = [make_user(f'key{i}@example.com') for i in range(2)]
+
+    def test_warm_submit_does_not_read_questions(self):
+        finish_attempt(self.users[0], self.test, 'a')  # builds the key
+        answers = [
+            {'question_id': q, 'selected_answer': 'a'}
+            for q in Question.objects.filter(section__test=self.test).values_list('id', flat=True)
+        ]
+        attempt = get_or_create_attempt(self.users[1], self.test)
+        with CaptureQueriesContext(connection) as ctx:
+            result = finalize_submission(attempt, answers)
+        self.assertEqual(result.correct_count, 2)
+        self.assertEqual([q['sql'] for q in ctx.captured_queries if 'FROM "core_question"' in q['sql']], [])
+
+    def test_editing_a_question_builds_a_new_key(self):
+        old_key = get_answer_key(self.test)
+        question = Question.objects.filter(section__test=self.test).order_by('section_id', 'id').first()
+        question.correct_option = 'b'
+        question.save()
+        self.test.refresh_from_db()
+
+        new_key = get_answer_key(self.test)
+        self.assertGreater(new_key.version, old_key.version)
+        self.assertEqual((old_key.correct_option(question.id), new_key.correct_option(question.id)), ('a', 'b'))
+        self.assertEqual(finish_attempt(self.users[0], self.test, 'b').correct_count, 3)
+
+
+class RegradeTests(TestCase):
+    def test_regrade_command_applies_a_key_fix(self):
+        cache.clear()
+        test = make_test(num_sections=1, questions_per_section=4, marks_incorrect=0)
+        alice, bob = make_user('alice@example.com'), make_user('bob@example.com')
+        finish_attempt(alice, test, 'a')  # 1 correct
+        finish_attempt(bob, test, 'b')    # 1 correct
+        # Key correction: every answer is 'b' (queryset update, no signals)
+        Question.objects.filter(section__test=test).update(correct_option='b')
+
+        call_command('regrade_test', test.id, '--chunk-size', '1', stdout=StringIO())
+        results = {r.user_id: r for r in TestResult.objects.filter(test=test)}
+        self.assertEqual((results[alice.id].score, results[alice.id].correct_count), (0, 0))
+        self.assertEqual((results[bob.id].score, results[bob.id].correct_count), (4, 4))
+        self.assertEqual(
+            list(LeaderboardEntry.objects.filter(test=test).order_by(*RANK_ORDER).values_list('user_id', flat=True)),
+            [bob.id, alice.id],
+        )
+        self.assertEqual(UserStats.objects.get(pk=bob.id).correct, 4)
+
+
+class RankingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.test = make_test(num_sections=1, questions_per_section=4, marks_incorrect=0)
+        # Scores 4, 3, 3, 2, 1, 1, 0 (ties broken by entry id)
+        self.users = []
+        for i, answers in enumerate(['abcd', 'abca', 'abcb', 'abaa', 'aaaa', 'bbbb', 'dddd']):
+            user = make_user(f'rank{i}@example.com')
+            question_ids = Question.objects.filter(section__test=self.test).values_list('id', flat=True)
+            finalize_submission(get_or_create_attempt(user, self.test), [
+                {'question_id': q, 'selected_answer': a} for q, a in zip(question_ids, answers)
+            ])
+            self.users.append(user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[3])
+
+    def test_keyset_pages_cover_the_ranking(self):
+        top = self.client.get(f'/api/tests/{self.test.id}/leaderboard/').json()
+        pages, cursor = [], ''
+        while cursor is not None:
+            page = self.client.get(f'/api/tests/{self.test.id}/leaderboard/', {'page_size': 3, 'cursor': cursor}).json()
+            pages.append(page['results'])
+            cursor = page['next']
+        self.assertEqual([len(p) for p in pages], [3, 3, 1])
+        self.assertEqual(sum(pages, []), top)
+        self.assertEqual(self.client.get(f'/api/tests/{self.test.id}/leaderboard/', {'cursor': 'junk'}).status_code, 400)
+
+    def test_my_rank_with_neighbours(self):
+        data = self.client.get(f'/api/tests/{self.test.id}/leaderboard/me/', {'around': 2}).json()
+        self.assertEqual((data['rank'], data['total']), (4, 7))
+        self.assertEqual([r['rank'] for r in data['above']], [2, 3])
+        self.assertEqual([r['rank'] for r in data['below']], [5, 6])
+        self.assertEqual(float(data['entry']['score']), 2.0)
+        # Paging on from the caller's neighbourhood keeps the ranks without recounting
+        rest = self.client.get(f'/api/tests/{self.test.id}/leaderboard/', {'cursor': data['next']}).json()
+        self.assertEqual([r['rank'] for r in rest['results']], [7])
+        self.assertIsNone(rest['next'])
+
+    def test_keyset_conditions_lead_with_a_score_bound(self):
+        entry = LeaderboardEntry.objects.get(test=self.test, user=self.users[3])
+        key = (entry.score, entry.time_remaining, entry.id)
+        # AND of a plain range on score and the OR chain
+        self.assertEqual((ahead_of(*key).connector, ahead_of(*key).children[0]), ('AND', ('score__gte', entry.score)))
+        self.assertEqual((behind(*key).connector, behind(*key).children[0]), ('AND', ('score__lte', entry.score)))
+
+    def test_rank_counts_only_the_callers_bucket(self):
+        ordered = list(LeaderboardEntry.objects.filter(test=self.test).order_by(*RANK_ORDER))
+        get_distribution(self.test.id)  # warm
+        for position, entry in enumerate(ordered, start=1):
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(rank_of(entry), position)
+            # Higher scores come from the cached histogram; one COUNT over the entry's own score
+            self.assertEqual(len(ctx.captured_queries), 1)
+
+
+class AggregateScoreTests(TestCase):
+    def scores(self, series_id):
+        return list(
+            AggregateScore.objects.filter(scope='series', scope_id=series_id)
+            .order_by('user_id').values_list('user_id', 'tests_taken', 'total_score', 'average_score')
+        )
+
+    def test_series_totals_follow_best_attempts(self):
+        mock1 = make_test(num_sections=1, questions_per_section=4, marks_incorrect=0)
+        mock2 = make_test(num_sections=1, questions_per_section=4, marks_incorrect=0)
+        alice, bob = make_user('alice@example.com'), make_user('bob@example.com')
+        finish_attempt(alice, mock1, 'a')  # 1
+        finish_attempt(alice, mock2, None)  # 0
+        finish_attempt(alice, mock2, 'b')  # improves to 1
+        finish_attempt(alice, mock1, None)  # worse, ignored
+        finish_attempt(bob, mock1, None)
+
+        series_id = mock1.test_series_id
+        self.assertEqual(self.scores(series_id), [(alice.id, 2, Decimal('2'), Decimal('1')), (bob.id, 1, 0, 0)])
+        incremental = self.scores(series_id)
+        rebuild_scope('series', series_id)
+        self.assertEqual(self.scores(series_id), incremental)
+
+        client = APIClient()
+        client.force_authenticate(bob)
+        top = client.get(f'/api/test-series/{series_id}/leaderboard/').json()
+        self.assertEqual([(r['rank'], r['tests_taken']) for r in top], [(1, 2), (2, 1)])
+        me = client.get(f'/api/exam-names/{mock1.test_series.category_id}/leaderboard/me/?order=average').json()
+        self.assertEqual(me['rank'], 2)
+
+    def test_rows_of_deleted_scopes_are_removed(self):
+        test = make_test(num_sections=1, questions_per_section=1)
+        finish_attempt(make_user(), test, 'a')
+        exam_id = test.test_series.category_id
+        self.assertEqual(AggregateScore.objects.count(), 2)
+        test.test_series.delete()
+        self.assertEqual(list(AggregateScore.objects.values_list('scope', 'scope_id')), [('exam', exam_id)])
+
+        # Left behind by a delete that sent no signal
+        ExamName.objects.filter(pk=exam_id)._raw_delete(ExamName.objects.db)
+        out = StringIO()
+        call_command('rebuild_aggregate_scores', stdout=out)
+        self.assertIn('Removed 1 row(s)', out.getvalue())
+        self.assertFalse(AggregateScore.objects.exists())
+
+
+class PercentileTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.test = make_test(num_sections=1, questions_per_section=4, marks_incorrect=0)
+        self.client = APIClient()
+
+    def submit(self, user, answer):
+        with self.captureOnCommitCallbacks(execute=True):
+            result = finish_attempt(user, self.test, answer)
+        self.client.force_authenticate(user)
+        return self.client.get(f'/api/results/{result.id}/').json()['percentile']
+
+    def test_live_submissions_are_counted_right_away(self):
+        users = [make_user(f'user{i}@example.com') for i in range(5)]
+        # Each submitter looks at their result straight away, during the rush
+        seen = [self.submit(user, answer) for user, answer in zip(users, ['a', 'a', 'a', None, None])]
+        self.assertEqual(seen, [100.0, 0.0, 0.0, 0.0, 0.0])
+        self.assertEqual(percentile_for(self.test.id, Decimal('1')), 40.0)
+        with self.assertNumQueries(0):
+            self.assertEqual(percentile_for(self.test.id, Decimal('0')), 0.0)
+
+        # An improved best moves between buckets, and a rebuild from the table agrees
+        self.submit(users[3], 'b')
+        self.assertEqual(percentile_for(self.test.id, Decimal('1')), 20.0)
+        cache.clear()
+        self.assertEqual(percentile_for(self.test.id, Decimal('1')), 20.0)
+
+    def test_old_histogram_is_rebuilt_by_one_reader(self):
+        self.submit(make_user('user0@example.com'), 'a')
+        finish_attempt(make_user('user1@example.com'), self.test, None)  # no on_commit: counter misses it
+        self.assertEqual(sum(get_distribution(self.test.id).counts()), 1)
+
+        later = timezone.now().timestamp() + PERCENTILE_MAX_AGE + 1
+        cache.add(f'{distribution_cache_key(self.test.id)}:rebuilding', True, None)  # another worker is on it
+        with mock.patch('core.percentiles.time.time', return_value=later), self.assertNumQueries(0):
+            self.assertEqual(sum(get_distribution(self.test.id).counts()), 1)
+        cache.delete(f'{distribution_cache_key(self.test.id)}:rebuilding')
+        with mock.patch('core.percentiles.time.time', return_value=later):
+            self.assertEqual(sum(get_distribution(self.test.id).counts()), 2)
+
+    def test_fine_score_grids_share_buckets(self):
+        test = make_test(num_sections=1, questions_per_section=200, marks_correct=Decimal('2'), marks_incorrect=Decimal('0.33'))
+        histogram = get_distribution(test.id)
+        self.assertLessEqual(histogram.buckets, HISTOGRAM_BUCKETS)
+        self.assertEqual((histogram.bucket_of(Decimal('-66')), histogram.bucket_of(Decimal('400'))), (0, histogram.buckets - 1))
+
+
+class UserStatsTests(TestCase):
+    def test_dashboard_stats_read_the_rollup(self):
+        test = make_test(num_sections=1, questions_per_section=4, marks_incorrect=0)
+        student = make_user()
+        finish_attempt(student, test, 'a')  # 1 correct, 3 incorrect
+        finish_attempt(student, test, 'b')  # 1 correct, 3 incorrect
+        finish_attempt(student, test, None)  # 4 skipped
+
+        client = APIClient()
+        client.force_authenticate(student)
+        with self.assertNumQueries(1):
+            stats = client.get('/api/dashboard/stats/').json()
+        self.assertEqual(stats['tests_taken'], 3)
+        self.assertEqual(stats['chart_data'], {'correct': 2, 'incorrect': 6, 'skipped': 4})
+        self.assertEqual(stats['accuracy'], 25.0)
+
+        UserStats.objects.all().delete()
+        self.assertEqual(client.get('/api/dashboard/stats/').json(), stats)
+
+    def test_first_submission_keeps_earlier_results(self):
+        test = make_test(num_sections=1, questions_per_section=4, marks_incorrect=0)
+        student = make_user()
+        finish_attempt(student, test, 'a')
+        UserStats.objects.all().delete()  # results from before the rollup existed
+        finish_attempt(student, test, None)
+        stats = UserStats.objects.get(pk=student.pk)
+        self.assertEqual((stats.tests_taken, stats.correct, stats.incorrect, stats.skipped), (2, 1, 3, 4))
+
+        before = stats.updated_at
+        finish_attempt(student, test, 'b')
+        stats.refresh_from_db()
+        self.assertEqual(stats.tests_taken, 3)
+        self.assertGreater(stats.updated_at, before)
+
+
+class DashboardSummaryTests(TestCase):
+    def test_summary_matches_panels_in_fixed_queries(self):
+        student = make_user()
+        for i in range(12):
+            finish_attempt(student, make_test(num_sections=1, questions_per_section=4), 'abcd'[i % 4])
+        get_or_create_attempt(student, make_test())
+
+        client = APIClient()
+        client.force_authenticate(student)
+        # user stats, latest results, pending attempt, series progress
+        with self.assertNumQueries(4):
+            summary = client.get('/api/dashboard/summary/').json()
+        for panel in ('stats', 'trend', 'resume', 'recent', 'my_series'):
+            self.assertEqual(summary[panel], client.get(f'/api/dashboard/{panel}/').json())
+        self.assertEqual(len(summary['trend']), 10)
+        self.assertEqual(len(summary['recent']), 5)
+
+    def test_recent_and_trend_do_not_query_per_row(self):
+        student = make_user()
+        for i in range(12):
+            finish_attempt(student, make_test(num_sections=1, questions_per_section=4), 'abcd'[i % 4])
+        client = APIClient()
+        client.force_authenticate(student)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(client.get('/api/dashboard/trend/').json()), 10)
+        with self.assertNumQueries(1):
+            recent = client.get('/api/dashboard/recent/').json()
+
+        # Results from before the stored summaries: one grouped count for all of them
+        TestResult.objects.update(correct_count=None)
+        with self.assertNumQueries(2):
+            self.assertEqual(client.get('/api/dashboard/recent/').json(), recent)
+
+
+class StreakTests(TestCase):
+    def test_streak_updates_match_rebuild(self):
+        student = make_user()
+        test = make_test()
+        day = date(2025, 3, 1)
+        # Active on days 0, 1, 2, then 5 (twice) and 6
+        for offset in (0, 1, 2, 2, 5, 5, 6):
+            record_activity(student.id, day + timedelta(days=offset))
+            result = TestResult.objects.create(user=student, test=test, score=1, is_completed=True)
+            TestResult.objects.filter(pk=result.pk).update(
+                completed_at=datetime.combine(day + timedelta(days=offset), time(12), tzinfo=dt_timezone.utc)
+            )
+
+        student.refresh_from_db()
+        self.assertEqual((student.longest_streak, student.last_active_date), (3, day + timedelta(days=6)))
+        self.assertEqual(streak_for(student, today=day + timedelta(days=7)), 2)
+        self.assertEqual(streak_for(student, today=day + timedelta(days=8)), 0)
+
+        stored = (student.current_streak, student.longest_streak, student.last_active_date)
+        rebuild_daily_activity([student.id])
+        rebuild_streaks([student.id])
+        student.refresh_from_db()
+        self.assertEqual((student.current_streak, student.longest_streak, student.last_active_date), stored)
+
+    def test_attempt_opened_earlier_counts_on_the_day_it_is_submitted(self):
+        student = make_user()
+        test = make_test()
+        today = timezone.localdate()
+        record_activity(student.id, today - timedelta(days=1))
+        attempt = get_or_create_attempt(student, test)
+        TestResult.objects.filter(pk=attempt.pk).update(completed_at=timezone.now() - timedelta(days=3))
+
+        finish_attempt(student, test, 'a')
+        student.refresh_from_db()
+        self.assertEqual((student.current_streak, student.last_active_date), (2, today))
+        self.assertEqual(TestResult.objects.get(pk=attempt.pk).completed_at.date(), timezone.now().date())
+
+
+class DailyActivityTests(TestCase):
+    def test_calendar_reads_the_daily_rollup(self):
+        student = make_user()
+        test = make_test(num_sections=1, questions_per_section=4)
+        finish_attempt(student, test, 'a')  # 1 of 4 correct
+        finish_attempt(student, test, None)  # skipped, nothing answered
+        old = finish_attempt(student, test, 'b')
+        TestResult.objects.filter(pk=old.pk).update(completed_at=timezone.now() - timedelta(days=400))
+
+        client = APIClient()
+        client.force_authenticate(student)
+        with self.assertNumQueries(1):
+            calendar = client.get('/api/dashboard/activity/').json()
+        today = timezone.localdate().isoformat()
+        self.assertEqual(calendar['to'], today)
+        # The third attempt was counted on the day it was submitted
+        self.assertEqual(calendar['days'], [{'date': today, 'tests': 3, 'questions': 8, 'accuracy': 25.0}])
+
+        # Rebuilt from the results, it moves to its (older than a year) completion day
+        kept = DailyActivity.objects.get(user=student, day=timezone.localdate())
+        rebuild_daily_activity([student.id])
+        calendar = client.get('/api/dashboard/activity/').json()
+        self.assertEqual(calendar['days'], [{'date': today, 'tests': 2, 'questions': 4, 'accuracy': 25.0}])
+        # Today's row was updated in place, not deleted and re-inserted
+        self.assertEqual(DailyActivity.objects.get(user=student, day=timezone.localdate()).pk, kept.pk)
+        self.assertEqual(DailyActivity.objects.filter(user=student).count(), 2)
+
+        TestResult.objects.filter(pk=old.pk).delete()
+        rebuild_daily_activity([student.id])
+        self.assertEqual(DailyActivity.objects.filter(user=student).count(), 1)
+
+
+class PackedAnswerSheetTests(TestCase):
+    def submit(self, test, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        answers = [
+            {'question_id': q.id, 'selected_answer': 'a' if i % 3 else None, 'marked_for_review': i == 1}
+            for i, q in enumerate(Question.objects.filter(section__test=test))
+        ]
+        response = client.post(f'/api/tests/{test.id}/submit/', {'responses': answers}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_packed_result_reads_like_rows(self):
+        test = make_test(num_sections=2, questions_per_section=4)
+        rows = self.submit(test, make_user('rows@example.com'))
+        with self.settings(RESPONSE_STORAGE='packed'):
+            packed = self.submit(test, make_user('packed@example.com'))
+
+        result = TestResult.objects.get(pk=packed['id'])
+        self.assertEqual(result.responses.count(), 0)
+        self.assertEqual(len(result.packed_answers), 8)
+        for field in ('score', 'correct_count', 'incorrect_count', 'unanswered_count', 'section_analysis'):
+            self.assertEqual(rows[field], packed[field])
+        strip = lambda responses: [{k: v for k, v in r.items() if k != 'id'} for r in responses]
+        self.assertEqual(strip(rows['responses']), strip(packed['responses']))
+
+    def test_invalid_answers_are_treated_as_skipped(self):
+        test = make_test(num_sections=1, questions_per_section=4)
+        q1, q2, q3, q4 = Question.objects.filter(section__test=test).values_list('id', flat=True)
+        answers = [
+            {'question_id': q1, 'selected_answer': 'ab'},
+            {'question_id': q2, 'selected_answer': 'B'},
+            {'question_id': q3, 'selected_answer': 'z'},
+            {'question_id': q4, 'selected_answer': 'd'},
+        ]
+        client = APIClient()
+        client.force_authenticate(make_user())
+        with self.settings(RESPONSE_STORAGE='packed'):
+            packed = client.post(f'/api/tests/{test.id}/submit/', {'responses': answers}, format='json').json()
+        self.assertEqual(TestResult.objects.get(pk=packed['id']).packed_answers, '-b-d')
+        self.assertEqual((packed['correct_count'], packed['unanswered_count']), (2, 2))
@@ -1,6 +1,6 @@
 # core/urls.py
 from django.urls import path, include
-from .views import MarkNotificationReadView,ClearNotificationsView,VerifyCouponView , NotificationListView, DashboardViewSet, SendOTPView,VerifyOTPView,TestLeaderboardView, UserDetailView,TestResultDetailView,TestResultListView ,SaveTestProgressView,TestSeriesDetailView, TestSeriesListView,TestDetailView,SubmitTestView, QuestionListView, CompleteProfile, VerifyPaymentView,CreateOrderView, ExamNameListView
+from .views import MarkNotificationReadView,ClearNotificationsView,VerifyCouponView , NotificationListView, DashboardViewSet, SendOTPView,VerifyOTPView,TestLeaderboardView, MyRankView, AggregateLeaderboardView, UserDetailView,TestResultDetailView,TestResultListView ,SaveTestProgressView,TestSeriesDetailView, TestSeriesListView,TestDetailView,SubmitTestView, TestManifestView, TestSectionQuestionsView, QuestionListView, CompleteProfile, VerifyPaymentView,CreateOrderView, ExamNameListView
 from dj_rest_auth.registration.views import VerifyEmailView  # <--- IMPORT THIS
 from rest_framework.routers import DefaultRouter
 
@@ -10,8 +10,14 @@ urlpatterns = [
     path('exam-names/', ExamNameListView.as_view()),
     path('test-series/', TestSeriesListView.as_view()),
     path('test-series/<int:pk>/', TestSeriesDetailView.as_view(),name='series-detail'),
+    path('test-series/<int:pk>/leaderboard/', AggregateLeaderboardView.as_view(scope='series'), name='series-leaderboard'),
+    path('test-series/<int:pk>/leaderboard/me/', AggregateLeaderboardView.as_view(scope='series', mine=True), name='series-leaderboard-me'),
+    path('exam-names/<int:pk>/leaderboard/', AggregateLeaderboardView.as_view(scope='exam'), name='exam-leaderboard'),
+    path('exam-names/<int:pk>/leaderboard/me/', AggregateLeaderboardView.as_view(scope='exam', mine=True), name='exam-leaderboard-me'),
     path('tests/<int:pk>/submit/', SubmitTestView.as_view(), name='submit-test'),
     path('tests/<int:pk>/', TestDetailView.as_view()),
+    path('tests/<int:pk>/manifest/', TestManifestView.as_view(), name='test-manifest'),
+    path('tests/<int:pk>/sections/<int:section_id>/', TestSectionQuestionsView.as_view(), name='test-section-questions'),
     path('users/me/', UserDetailView.as_view(), name = 'user-detail'),
 # path('tests/<int:test_id>/questions/', QuestionListView.as_view(), name='question-list'),
 path("auth/complete-profile/", CompleteProfile.as_view()),
@@ -26,6 +32,7 @@ path('payments/create-order/', CreateOrderView.as_view(), name='create-order'),
     path('results/<int:pk>/', TestResultDetailView.as_view()),
         path('results/', TestResultListView.as_view(), name='result-list'),  
         path('tests/<int:pk>/leaderboard/', TestLeaderboardView.as_view(), name='test-leaderboard'), 
+        path('tests/<int:pk>/leaderboard/me/', MyRankView.as_view(), name='test-leaderboard-me'),
             path('auth/send-otp/', SendOTPView.as_view(), name='send-otp'),
     path('auth/verify-otp/', VerifyOTPView.as_view(), name='verify-otp'),  
     path('verify-coupon/', VerifyCouponView.as_view(), name='verify-coupon'),
@@ -0,0 +1,110 @@
+# core/userstats.py
+"""
+Per-user rollup (UserStats) behind the dashboard stat cards.
+
+finalize_submission adds each finished attempt to its user's row with F()
+expressions (record_result). Regrades change scores and counts of many users
+at once, so regrade_test recomputes the affected users from their results
+instead (rebuild_user_stats), as does the `rebuild_user_stats` command. A
+rebuild holds the users' rows locked from reading the results to writing the
+totals; submissions take the same lock before adding themselves.
+
+A user without a row yet gets one inserted (ON CONFLICT DO NOTHING) holding
+their other completed results, on first read or first submission. A
+submission then adds itself with the same F() update as always, so two
+concurrent first submissions both land on whichever row was inserted, instead
+of one overwriting the other's totals.
+"""
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .answersheets import ROW_COUNTS, packed_counts
+from .models import CustomUser, TestResult, UserResponse, UserStats
+
+
+STAT_FIELDS = ['tests_taken', 'score_sum', 'correct', 'incorrect', 'skipped']
+
+
+def record_result(test_result):
+    """Adds a newly completed attempt (with its summary columns filled) to the user's totals."""
+    rows = UserStats.objects.filter(pk=test_result.user_id)
+    changes = {
+        'tests_taken': F('tests_taken') + 1,
+        'score_sum': F('score_sum') + test_result.score,
+        'correct': F('correct') + test_result.correct_count,
+        'incorrect': F('incorrect') + test_result.incorrect_count,
+        'skipped': F('skipped') + test_result.unanswered_count,
+        'updated_at': timezone.now(),  # update() skips auto_now
+    }
+    if not rows.update(**changes):
+        # First attempt since the rollup exists: a row of the user's other results, then this one on top
+        create_missing_stats([test_result.user_id], exclude_result_id=test_result.id)
+        rows.update(**changes)
+
+
+def user_totals(user_ids, exclude_result_id=None):
+    """{user_id: {tests_taken, score_sum, correct, incorrect, skipped}} over completed results (a few grouped queries)."""
+    results = TestResult.objects.filter(user_id__in=user_ids, is_completed=True)
+    if exclude_result_id is not None:
+        results = results.exclude(pk=exclude_result_id)
+    totals = {user_id: {'tests_taken': 0, 'score_sum': 0, 'correct': 0, 'incorrect': 0, 'skipped': 0} for user_id in user_ids}
+
+    for row in results.values('user_id').annotate(
+        taken=Count('id'), score=Sum('score'),
+        summed_correct=Sum('correct_count'), summed_incorrect=Sum('incorrect_count'), summed_skipped=Sum('unanswered_count'),
+    ).order_by():
+        total = totals[row['user_id']]
+        total['tests_taken'] = row['taken']
+        total['score_sum'] = row['score'] or 0
+        total['correct'] += row['summed_correct'] or 0
+        total['incorrect'] += row['summed_incorrect'] or 0
+        total['skipped'] += row['summed_skipped'] or 0
+
+    # Results graded before the summary columns existed (see backfill_result_summary)
+    unsummarized = results.filter(correct_count__isnull=True)
+    for row in UserResponse.objects.filter(test_result__in=unsummarized).values(
+        'test_result__user_id'
+    ).annotate(**ROW_COUNTS).order_by():
+        total = totals[row['test_result__user_id']]
+        total['correct'] += row['correct']
+        total['incorrect'] += row['incorrect']
+        total['skipped'] += row['unanswered']
+    for user_id, packed_answers, packed_correct in unsummarized.filter(layout__isnull=False).values_list(
+        'user_id', 'packed_answers', 'packed_correct'
+    ):
+        counts = packed_counts(packed_answers, packed_correct)
+        totals[user_id]['correct'] += counts['correct']
+        totals[user_id]['incorrect'] += counts['incorrect']
+        totals[user_id]['skipped'] += counts['unanswered']
+    return totals
+
+
+@transaction.atomic
+def rebuild_user_stats(user_ids):
+    """Recomputes the rows of `user_ids` from their completed results, overwriting them."""
+    # finalize_submission locks the user before record_result, so a submission can't commit
+    # between the read of the totals below and the overwrite (same lock as rebuild_daily_activity)
+    list(CustomUser.objects.select_for_update().filter(pk__in=user_ids).order_by('pk').values_list('id', flat=True))
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=user_id, **total) for user_id, total in user_totals(user_ids).items()],
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=STAT_FIELDS + ['updated_at'],
+    )
+
+
+def create_missing_stats(user_ids, exclude_result_id=None):
+    """Inserts rows for the users that have none; rows that exist (or appear meanwhile) are left alone."""
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=user_id, **total) for user_id, total in user_totals(user_ids, exclude_result_id).items()],
+        ignore_conflicts=True,
+    )
+
+
+def get_user_stats(user):
+    stats = UserStats.objects.filter(pk=user.pk).first()
+    if stats is None:
+        create_missing_stats([user.pk])
+        stats = UserStats.objects.get(pk=user.pk)
+    return stats
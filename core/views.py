@@ -3,12 +3,13 @@ from rest_framework import generics
 from rest_framework.decorators import action
 from django.db.models import Avg, Count, Sum
 from django.db.models import Count, Q, Case, When, IntegerField
-from .models import Coupon, Notification, CustomUser,Test, TestSeries, Question, TestResult, UserResponse, ExamName,PhoneOTP, CustomUser
-from .serializers import NotificationSerializer, CustomRegisterSerializer, ExamNameSerializer,TestResultListSerializer, TestSeriesListSerializer,TestResultDetailSerializer,QuestionSerializer, TestSectionSerializer, UserSerializer, LeaderboardSerializer,TestSeriesDetailSerializer
+from .models import AggregateScore, Coupon, LeaderboardEntry, Notification, CustomUser,Test, TestSeries, Question, TestResult, UserResponse, ExamName,PhoneOTP, CustomUser
+from .serializers import NotificationSerializer, CustomRegisterSerializer, ExamNameSerializer,TestResultListSerializer, TestSeriesListSerializer,TestResultDetailSerializer,QuestionSerializer, TestSectionSerializer, UserSerializer, LeaderboardSerializer,TestSeriesDetailSerializer, AggregateScoreSerializer
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions,viewsets
 from django.shortcuts import get_object_or_404
+from django.http import Http404
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import get_user_model
 import razorpay
@@ -19,6 +20,23 @@ from datetime import timedelta
 from django.utils import timezone
 from django.conf import settings
 import random
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
+from .blobs import JsonBlob, blob_response
+from .aggregates import aggregate_rank, top_scores
+from .leaderboard import decode_cursor, encode_cursor, entries_after, entries_before, rank_of, top_entries
+from .percentiles import get_distribution
+from .activity import activity_calendar
+from .dashboard import (
+    RECENT_LIMIT, TREND_LIMIT, build_summary, completed_results, my_series_panel, recent_panel, resume_panel,
+    server_timing, stats_panel, trend_panel,
+)
+from .submissions import enqueue_submission, finalize_submission, get_or_create_attempt
+from .papers import get_paper_language, get_paper_snapshot, get_paper_manifest, get_section_snapshot
+from .autosave import (
+    MAX_SEQ, AttemptClosed, BufferBusy, autosave_buffered, buffer_progress, get_buffered,
+    get_or_create_autosave_attempt, merge_buffered, save_progress,
+)
 
 class VerifyCouponView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -109,13 +127,44 @@ class QuestionListView(generics.ListAPIView):
         test_id = self.kwargs['test_id']
         return Question.objects.filter(section__test__id=test_id)
     
-# This is the view that will serve our nested data
-class TestDetailView(generics.RetrieveAPIView):
-    """Returns the actual Exam Paper (Questions & Sections).
-    SECURE: Checks if the user is allowed to access this specific test."""
-    
-    queryset = Test.objects.all()
-    serializer_class = TestSectionSerializer
+def get_saved_progress(user, test):
+    """The user's ongoing attempt (timer + answers), added on top of a cached paper."""
+    data = {}
+    # Check if there is an ongoing (incomplete) test for this user.
+    # This is the only place the attempt is looked up for the request.
+    ongoing_result = TestResult.objects.filter(
+        user=user, 
+        test=test, 
+        is_completed=False
+    ).first()
+
+    if ongoing_result:
+        # 1. Add Saved Time (and the last autosave seq, so a reloaded client continues after it)
+        data['saved_time_remaining'] = ongoing_result.time_remaining
+        data['saved_seq'] = ongoing_result.autosave_seq
+        
+        # 2. Add Saved Responses
+        saved_responses = UserResponse.objects.filter(test_result=ongoing_result).values(
+            'question_id', 'selected_answer', 'marked_for_review'
+        )
+        data['saved_responses'] = list(saved_responses)
+
+        # 3. Autosaves still waiting in the write-behind buffer are newer than the DB
+        buffered = get_buffered(ongoing_result.id)
+        if buffered:
+            if buffered['time_remaining'] is not None:
+                data['saved_time_remaining'] = buffered['time_remaining']
+            data['saved_seq'] = max(buffered['seq'] or 0, data['saved_seq'])
+            data['saved_responses'] = merge_buffered(data['saved_responses'], buffered)
+    else:
+        data['saved_time_remaining'] = None
+        data['saved_seq'] = 0
+        data['saved_responses'] = []
+    return data
+
+
+class PaperAccessMixin:
+    """Shared access rules for everything that serves questions of a test."""
     permission_classes=[permissions.IsAuthenticated]
 
     def get_queryset(self):
@@ -123,137 +172,85 @@ class TestDetailView(generics.RetrieveAPIView):
         # If is_published=False, Django returns 404 Not Found
         return Test.objects.filter(is_published=True)
 
-    def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-        user=request.user
-        if not instance.is_free and not getattr(user, 'is_pro_member', False):
+    def get_locked_response(self, test):
+        if not test.is_free and not getattr(self.request.user, 'is_pro_member', False):
             return Response(
                 {"detail": "Access Denied: This test is locked for free users."}, 
                 status=status.HTTP_403_FORBIDDEN
             )
-        serializer = self.get_serializer(instance)
-        data = serializer.data
-
-        # --- NEW LOGIC: INJECT SAVED PROGRESS ---
-        # Check if there is an ongoing (incomplete) test for this user
-        ongoing_result = TestResult.objects.filter(
-            user=user, 
-            test=instance, 
-            is_completed=False
-        ).first()
-
-        if ongoing_result:
-            # 1. Add Saved Time
-            data['saved_time_remaining'] = ongoing_result.time_remaining
-            
-            # 2. Add Saved Responses
-            saved_responses = UserResponse.objects.filter(test_result=ongoing_result).values(
-                'question_id', 'selected_answer', 'marked_for_review'
-            )
-            data['saved_responses'] = list(saved_responses)
-        else:
-            data['saved_time_remaining'] = None
-            data['saved_responses'] = []
-        return Response(data) 
+        return None
+
+
+# This is the view that will serve our nested data
+class TestDetailView(PaperAccessMixin, generics.RetrieveAPIView):
+    """Returns the actual Exam Paper (Questions & Sections).
+    SECURE: Checks if the user is allowed to access this specific test."""
+    
+    queryset = Test.objects.all()
+    serializer_class = TestSectionSerializer
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        locked = self.get_locked_response(instance)
+        if locked:
+            return locked
+        # The paper itself is shared by everyone, so it comes pre-rendered from the
+        # snapshot cache (one per language); only this user's progress is appended.
+        lang = get_paper_language(request)
+        paper = get_paper_snapshot(instance, lang)
+        return blob_response(request, paper, get_saved_progress(request.user, instance))
+
+
+class TestManifestView(PaperAccessMixin, generics.RetrieveAPIView):
+    """Lightweight paper outline (sections, question counts, duration) plus saved progress.
+    The client then pulls questions one section at a time from TestSectionQuestionsView."""
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        locked = self.get_locked_response(instance)
+        if locked:
+            return locked
+        manifest = get_paper_manifest(instance)
+        return blob_response(request, manifest, get_saved_progress(request.user, instance))
+
+
+class TestSectionQuestionsView(PaperAccessMixin, generics.RetrieveAPIView):
+    """Questions of a single section: /api/tests/<pk>/sections/<section_id>/?lang=en|hi|both"""
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        locked = self.get_locked_response(instance)
+        if locked:
+            return locked
+        lang = get_paper_language(request)
+        return blob_response(request, get_section_snapshot(instance, self.kwargs['section_id'], lang))
     
 
 class SubmitTestView(APIView):
-    """This API will save timer state every minute"""
+    """Grades and saves a finished test.
+    With settings.ASYNC_SUBMISSIONS the answer sheet is only queued for the `process_submissions`
+    worker (Procfile `worker`) and the client gets 202 + the result id to poll on /api/results/<id>/.
+    Only the deployment chooses: a client can't queue work that no worker may be running for."""
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, pk, format=None):
+        test = get_object_or_404(Test, pk=pk)
+        answers = request.data.get('responses', [])
+        if getattr(settings, 'ASYNC_SUBMISSIONS', False):
+            # Short transaction: just make the sheet durable, a worker grades it
+            with transaction.atomic():
+                test_result = get_or_create_attempt(request.user, test)
+                enqueue_submission(test_result, answers)
+            return Response({
+                "result_id": test_result.id,
+                "status": "pending",
+                "poll_url": f"/api/results/{test_result.id}/"
+            }, status=status.HTTP_202_ACCEPTED)
+
         # Start the atomic transaction block
         with transaction.atomic():
-            test = get_object_or_404(Test, pk=pk)
-            user = request.user
-            answers = request.data.get('responses', [])
-            score = 0.0
-            correct_count = 0
-            incorrect_count = 0
-            answered_count = 0
-            unanswered_count = 0
-            
-            all_test_questions = Question.objects.filter(section__test=test)
-            correct_answers = {q.id: q.correct_option for q in all_test_questions}
-            user_answers_map = {ans['question_id']: ans for ans in answers}
-
-            # Get or Create TestResult
-            test_result = TestResult.objects.filter(
-                user=user, 
-                test=test, 
-                is_completed=False
-            ).last()
-
-            if not test_result:
-                test_result = TestResult.objects.create(
-                    user=user, 
-                    test=test, 
-                    is_completed=False,
-                    score=0
-                )
-
-            # Now we will loop user answers and calculate score
-            responses_to_create = []
-            
-            for question in all_test_questions:
-                is_correct = False
-                selected_answer = None
-                marked_for_review = False
-
-                if question.id in user_answers_map:
-                    user_answer_data = user_answers_map[question.id]
-                    selected_answer = user_answer_data.get('selected_answer')
-                    marked_for_review = user_answer_data.get('marked_for_review', False)
-
-                    if selected_answer:
-                        answered_count += 1
-                        if selected_answer.lower() == correct_answers[question.id]:
-                            is_correct = True
-                            correct_count += 1
-                            score += float(test.marks_correct)
-                        else:
-                            incorrect_count += 1
-                            score -= float(test.marks_incorrect)
-                    else:
-                        unanswered_count += 1
-                else:
-                    unanswered_count += 1
-
-                # Add to bulk list
-                responses_to_create.append(UserResponse(
-                    test_result=test_result, 
-                    question=question,
-                    selected_answer=selected_answer,
-                    marked_for_review=marked_for_review,
-                    is_correct=is_correct
-                ))
-
-            # Database operations (Safe inside atomic block)
-            # 1. Delete old responses for this result to avoid duplicates
-            UserResponse.objects.filter(test_result=test_result).delete()
-            
-            # 2. Bulk create new responses
-            UserResponse.objects.bulk_create(responses_to_create)
-            
-            # 3. Cleanup other incomplete attempts for this test/user
-            TestResult.objects.filter(
-                user=user, 
-                test=test, 
-                is_completed=False
-            ).exclude(id=test_result.id).delete()
-
-            # 4. Finalize Test Result
-            test_result.score = score
-            test_result.is_completed = True
-            test_result.time_remaining = 0
-            test_result.save()
-
-            Notification.objects.create(
-                user=user,
-                title="Test Result Published",
-                message=f"You scored {score} in {test.title}. Check your detailed analysis now.",
-                notification_type="RESULT"
-            )
+            test_result = get_or_create_attempt(request.user, test)
+            finalize_submission(test_result, answers)
        
         # --- BUILD THE FINAL RESPONSE (Outside atomic block) ---
         serializer = TestResultDetailSerializer(test_result)
@@ -264,35 +261,38 @@ class SaveTestProgressView(APIView):
     def post(self, request, pk):
         time_remaining = request.data.get('time_remaining')
         responses = request.data.get('responses', [])
-        test=get_object_or_404(Test,pk=pk)
-        test_result, created = TestResult.objects.get_or_create(
-            user=request.user,
-            test=test,
-            is_completed=False,
-            defaults={'time_remaining': test.duration_minutes * 60,'score':0.0}
-        )
-        if time_remaining is not None:
-            test_result.time_remaining = time_remaining
-            test_result.save()
-        
-        for resp in responses:
-            question_id = resp.get('question_id')
-            selected_answer = resp.get('selected_answer')
-            marked_for_review = resp.get('marked_for_review', False)
-            
-            if question_id:
-                # Update existing response or create new one
-                UserResponse.objects.update_or_create(
-                    test_result=test_result,
-                    question_id=question_id,
-                    defaults={
-                        'selected_answer': selected_answer,
-                        'marked_for_review': marked_for_review,
-                        'is_correct': False # We don't grade yet
-                    }
+        # Optional: clients using the delta protocol send only changed answers + an increasing seq
+        seq = request.data.get('seq')
+        if seq is not None:
+            try:
+                seq = int(seq)
+            except (TypeError, ValueError):
+                seq = None
+            if seq is None or not 0 < seq <= MAX_SEQ:
+                return Response(
+                    {"error": f"seq must be an integer between 1 and {MAX_SEQ}"}, status=status.HTTP_400_BAD_REQUEST
                 )
-
-        return Response({"status": "saved"}, status=status.HTTP_200_OK)
+        try:
+            test_result = get_or_create_autosave_attempt(request.user, pk)
+        except Test.DoesNotExist:
+            raise Http404
+        # Timer + every answer in a fixed number of queries, or into the write-behind buffer (see core/autosave.py)
+        save = buffer_progress if autosave_buffered() else save_progress
+        try:
+            saved = save(test_result, time_remaining, responses, seq)
+        except AttemptClosed:
+            # Submitted meanwhile (other tab, async queue); the graded sheet is final
+            return Response({"status": "submitted", "seq": seq}, status=status.HTTP_409_CONFLICT)
+        except BufferBusy:
+            # Another save of this attempt is being applied; the client retries with the same seq
+            response = Response({"status": "busy", "seq": seq}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            response['Retry-After'] = '1'
+            return response
+        if not saved:
+            # An older save arriving after a newer one; the newer state is kept
+            return Response({"status": "stale", "seq": seq}, status=status.HTTP_200_OK)
+
+        return Response({"status": "saved", "seq": seq}, status=status.HTTP_200_OK)
 
 
 class UserDetailView(generics.RetrieveAPIView):
@@ -509,6 +509,8 @@ class TestResultListView(generics.ListAPIView):
         ).order_by('-completed_at')
 
 
+RESULT_CACHE_TIMEOUT = 60 * 60  # 1 hour
+
 class TestResultDetailView(generics.RetrieveAPIView):
     """
     Returns the detailed report card for a specific result.
@@ -517,7 +519,59 @@ class TestResultDetailView(generics.RetrieveAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return TestResult.objects.filter(user=self.request.user)
+        return TestResult.objects.filter(user=self.request.user).select_related('test')
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        lang = get_paper_language(self.request)
+        context['lang'] = lang
+        # Used for packed answer sheets, whose questions are fetched separately
+        context['question_queryset'] = Question.objects.only(
+            'id', 'section', 'correct_option', *Question.language_columns(lang)
+        )
+        return context
+
+    def load_responses(self, instance, lang):
+        if instance.layout_id:
+            return  # packed sheet, no rows to prefetch
+        # Load each response's question with only the text columns of the requested language
+        question_columns = ['question__' + c for c in Question.language_columns(lang)]
+        responses = UserResponse.objects.select_related('question').only(
+            'id', 'test_result', 'selected_answer', 'is_correct', 'marked_for_review',
+            'question__id', 'question__section', 'question__correct_option', *question_columns
+        )
+        prefetch_related_objects([instance], Prefetch('responses', queryset=responses))
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        lang = get_paper_language(request)
+        serializer = self.get_serializer(instance)
+
+        if not instance.is_completed:
+            # Submitted in async mode and not graded yet: tell the client to keep polling
+            queued = instance.pending_submissions.exclude(status='DONE').order_by('-id').first()
+            if queued:
+                return Response({
+                    "id": instance.id,
+                    "status": "failed" if queued.status == 'FAILED' else "pending"
+                }, status=status.HTTP_202_ACCEPTED)
+            self.load_responses(instance, lang)
+            return Response(serializer.data)
+
+        # A submitted report card never changes (until a regrade touches last_updated),
+        # so it is rendered once. Percentile moves as others submit, so it is appended live.
+        def build():
+            self.load_responses(instance, lang)
+            data = dict(serializer.data)
+            data.pop('percentile', None)
+            return JsonBlob(data)
+
+        key = f"result:{instance.pk}:{instance.last_updated.timestamp()}:v{instance.test.paper_version}:{lang}"
+        report = cache.get_or_set(key, build, RESULT_CACHE_TIMEOUT)
+        return blob_response(request, report, {"percentile": serializer.get_percentile(instance)})
+
+LEADERBOARD_MAX_PAGE = 200
+
 
 class TestLeaderboardView(generics.ListAPIView):
     """
@@ -529,32 +583,118 @@ class TestLeaderboardView(generics.ListAPIView):
     
     def get_queryset(self):
         # getting test_id from URL: /api/tests/<pk>/leaderboard/
-        test_id = self.kwargs['pk']
-        
-        return TestResult.objects.filter(
-            test_id=test_id, 
-            is_completed=True
-        ).order_by('user','-score', '-time_remaining').distinct('user')
+        # Best attempts are maintained at submit time (core/leaderboard.py), so this is one indexed read
+        return top_entries(self.kwargs['pk'], limit=50)
+
     def list(self, request, *args, **kwargs):
-        test_id = self.kwargs['pk']
-        
-        queryset = TestResult.objects.filter(test_id=test_id, is_completed=True)\
-            .order_by('user', '-score')\
-            .distinct('user')
-        sorted_results = sorted(
-            queryset, 
-            key=lambda x: (-x.score, -x.time_remaining)
-        )[:50]
+        if 'cursor' in request.query_params or 'page_size' in request.query_params:
+            return self.list_page(request)
 
-        for index, result in enumerate(sorted_results):
-            result.rank = index + 1  # 1st item = Rank 1
+        entries = list(self.get_queryset())
+        for index, entry in enumerate(entries):
+            entry.rank = index + 1  # 1st item = Rank 1
 
         # 3. Serialize
-        serializer = self.get_serializer(sorted_results, many=True)
+        serializer = self.get_serializer(entries, many=True)
         return Response(serializer.data)
+
+    def list_page(self, request):
+        """Full ranking, page by page: ?page_size=50, then ?cursor=<next> from the previous page.
+        Keyset pagination on (score, time, id), so page 1000 is as cheap as page 1."""
+        try:
+            page_size = min(max(int(request.query_params.get('page_size', 50)), 1), LEADERBOARD_MAX_PAGE)
+        except ValueError:
+            return Response({"error": "page_size must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        key, last_rank = None, 0
+        if request.query_params.get('cursor'):
+            try:
+                key, last_rank = decode_cursor(request.query_params['cursor'])
+            except ValueError:
+                return Response({"error": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # One extra row tells whether there is a next page
+        entries = entries_after(self.kwargs['pk'], key, page_size + 1)
+        has_next = len(entries) > page_size
+        entries = entries[:page_size]
+        for index, entry in enumerate(entries):
+            entry.rank = last_rank + index + 1
+
+        return Response({
+            "results": self.get_serializer(entries, many=True).data,
+            "next": encode_cursor(entries[-1], entries[-1].rank) if has_next else None,
+        })
+
+
+class MyRankView(APIView):
+    """The caller's rank on a test plus a few neighbours: /api/tests/<pk>/leaderboard/me/?around=2"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        try:
+            around = min(max(int(request.query_params.get('around', 2)), 0), 10)
+        except ValueError:
+            return Response({"error": "around must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Cached histogram of everyone on the board: the total, and the users above the caller's bucket
+        histogram = get_distribution(pk)
+        counts = histogram.counts()
+        total = sum(counts)
+        entry = LeaderboardEntry.objects.filter(test_id=pk, user=request.user).select_related('user').first()
+        if entry is None:
+            return Response({"rank": None, "total": total, "entry": None, "above": [], "below": [], "next": None})
+
+        entry.rank = rank_of(entry, histogram, counts)
+        key = (entry.score, entry.time_remaining, entry.id)
+        above = entries_before(pk, key, around)
+        # One extra row tells whether the ranking goes on after the neighbours
+        below = entries_after(pk, key, around + 1)
+        has_next = len(below) > around
+        below = below[:around]
+        for index, neighbour in enumerate(above):
+            neighbour.rank = entry.rank - len(above) + index
+        for index, neighbour in enumerate(below):
+            neighbour.rank = entry.rank + index + 1
+        last = below[-1] if below else entry
+
+        return Response({
+            "rank": entry.rank,
+            # Cached counts can lag (see core/percentiles.py); never report fewer than we can see
+            "total": max(total, last.rank),
+            "entry": LeaderboardSerializer(entry).data,
+            "above": LeaderboardSerializer(above, many=True).data,
+            "below": LeaderboardSerializer(below, many=True).data,
+            # Continue with the full ranking (?cursor=) from here without counting the rank again
+            "next": encode_cursor(last, last.rank) if has_next else None,
+        })
     
 
 
+class AggregateLeaderboardView(APIView):
+    """Series / exam leaderboard over everyone's best scores:
+    /api/test-series/<pk>/leaderboard/?order=total|average (and /api/exam-names/<pk>/leaderboard/).
+    The /me/ variant returns the caller's row and rank instead of the top 50."""
+    permission_classes = [permissions.IsAuthenticated]
+    scope = 'series'
+    mine = False
+
+    def get(self, request, pk):
+        order = request.query_params.get('order', 'total')
+        if order not in ('total', 'average'):
+            return Response({"error": "order must be 'total' or 'average'"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if self.mine:
+            row = AggregateScore.objects.filter(scope=self.scope, scope_id=pk, user=request.user).select_related('user').first()
+            if row is None:
+                return Response({"rank": None, "entry": None})
+            row.rank = aggregate_rank(row, order)
+            return Response({"rank": row.rank, "entry": AggregateScoreSerializer(row).data})
+
+        rows = list(top_scores(self.scope, pk, order))
+        for index, row in enumerate(rows):
+            row.rank = index + 1
+        return Response(AggregateScoreSerializer(rows, many=True).data)
+
+
 # Helper to send OTP
 def send_sms(phone, otp):
     # For Dev: Print to console
@@ -699,171 +839,43 @@ class RegisterUserView(APIView):
 
 
 class DashboardViewSet(viewsets.ViewSet):
+    """Dashboard panels; the panels themselves are built in core/dashboard.py."""
     permission_classes = [permissions.IsAuthenticated]
   # 1. Performance Stats & Overall Accuracy (Top Row + Doughnut Chart)
     @action(detail=False, methods=['get'])
     def stats(self, request):
-        user = request.user
-        
-        # Get all COMPLETED results
-        completed_results = TestResult.objects.filter(user=user, is_completed=True)
-        
-        # 1. Tests Taken
-        tests_taken = completed_results.count()
+        return Response(stats_panel(request.user))
 
-        # 2. Average Score
-        avg_score = completed_results.aggregate(Avg('score'))['score__avg'] or 0
-        
-        # 3. Aggregated Counts for Accuracy Chart
-        # We need to sum up correct/incorrect across ALL tests.
-        # Efficient way: Filter UserResponse objects linked to completed tests.
-        
-        all_responses = UserResponse.objects.filter(
-            test_result__user=user, 
-            test_result__is_completed=True
-        )
-        
-        # Correct Answers
-        total_correct = all_responses.filter(is_correct=True).count()
-        
-        # Incorrect Answers (Attempted but wrong)
-        # Note: We assume 'selected_answer' is not null for attempted questions
-        total_incorrect = all_responses.filter(is_correct=False).exclude(selected_answer__isnull=True).count()
-        
-        # Questions Attempted
-        questions_attempted = total_correct + total_incorrect
-
-        # Skipped Questions Logic
-        # This is harder to get from UserResponse if we don't save skipped rows.
-        # But wait! Your SubmitTestView DOES save skipped rows (as None).
-        # So we can just count them.
-        total_skipped = all_responses.filter(selected_answer__isnull=True).count()
-        
-        # Total Questions Seen (Correct + Incorrect + Skipped)
-        total_questions_seen = questions_attempted + total_skipped
-
-        # 4. Overall Accuracy Calculation
-        # Formula: (Total Correct / Total Questions Seen) * 100
-        # OR: (Total Correct / Total Attempted) * 100 ? 
-        # Usually "Accuracy" implies (Correct / Attempted). 
-        # "Score Percentage" implies (Correct / Total Questions).
-        # Let's stick to Accuracy (Correct / Attempted) for the stat card, 
-        # but send all counts for the Pie Chart.
-        
-        overall_accuracy = 0
-        if questions_attempted > 0:
-            overall_accuracy = round((total_correct / questions_attempted) * 100, 1)
-
-        return Response({
-            "tests_taken": tests_taken,
-            "avg_score": round(avg_score, 1),
-            "questions_attempted": questions_attempted,
-            "accuracy": overall_accuracy,
-            "total_questions": total_questions_seen,
-            
-            # Extra data for Charts
-            "chart_data": {
-                "correct": total_correct,
-                "incorrect": total_incorrect,
-                "skipped": total_skipped
-            }
-        })
         # 2. Performance Trend (Line Chart)
     @action(detail=False, methods=['get'])
     def trend(self, request):
-        user=request.user
-        recent_results = TestResult.objects.filter(user=user, is_completed=True).order_by('-completed_at')[:10]
-        data = []
-        for result in reversed(recent_results):
-            data.append({
-                "test_title": result.test.title,
-                "score": result.score,
-                "date": result.completed_at.strftime("%b %d") # e.g. "Oct 18"
-            })
-            
-        return Response(data)
+        return Response(trend_panel(completed_results(request.user, TREND_LIMIT)))
     
     @action(detail=False, methods=['get'])
     def resume(self, request):
-        user = request.user
-        # Find the most recently updated INCOMPLETE test
-        pending_test = TestResult.objects.filter(user=user, is_completed=False).order_by('-last_updated').first()
-        
-        if pending_test:
-            return Response({
-                "id": pending_test.test.id,
-                "name": pending_test.test.title,
-                "category": pending_test.test.test_series.category.name, # Assuming relations exist
-                "description": pending_test.test.test_series.description[:100] + "...", # Truncate description
-                "lastActive": pending_test.last_updated.strftime("%b %d, %I:%M %p"), # "Oct 18, 10:30 AM"
-                "progress_time": pending_test.time_remaining # You might use this to calculate % if needed
-            })
-        return Response("Yayy, you have no pending tests") # No pending test
+        return Response(resume_panel(request.user))
     
     # 4. Recent Activity (Table)
     @action(detail=False, methods=['get'])
     def recent(self, request):
-        user = request.user
-        recent_results = TestResult.objects.filter(user=user, is_completed=True).order_by('-completed_at')[:5]
-        
-        data = []
-        for result in recent_results:
-            # Calculate accuracy for this specific test
-            total_attempted = result.responses.exclude(selected_answer__isnull=True).count()
-            correct = result.responses.filter(is_correct=True).count()
-            accuracy = round((correct / total_attempted * 100), 1) if total_attempted > 0 else 0
-
-            data.append({
-                "id": result.id, # Result ID for navigation
-                "name": result.test.title,
-                "category": result.test.test_series.category.name,
-                "score": result.score,
-                "accuracy": accuracy,
-                "date": result.completed_at.strftime("%b %d, %Y")
-            })
-            
-        return Response(data)
+        return Response(recent_panel(completed_results(request.user, RECENT_LIMIT)))
 
-    # 5. My Series (Sidebar) - Simplified for now
-    # Ideally, this should calculate progress % for each series
+    # 5. My Series (Sidebar)
+    @action(detail=False, methods=['get'])
+    def my_series(self, request):
+        return Response(my_series_panel(request.user))
 
+    # 6. Practice Calendar (Heatmap), from the per-day rollup
+    @action(detail=False, methods=['get'])
+    def activity(self, request):
+        return Response(activity_calendar(request.user))
 
+    # All five panels in one round trip, from shared reads
     @action(detail=False, methods=['get'])
-    def my_series(self, request):
-        user = request.user
-        
-        # 1. THE OPTIMIZED QUERY
-        # We fetch Series + Category + Counts in a single DB hit.
-        all_series = TestSeries.objects.select_related('category').annotate(
-            # Count total tests in this series
-            total_tests_count=Count('test', distinct=True),
-            
-            # Count unique tests completed by THIS user in this series
-            # We use filter=Q(...) to count only the relevant rows
-            completed_tests_count=Count(
-                'test__testresult',
-                filter=Q(test__testresult__user=user, test__testresult__is_completed=True),
-                distinct=True
-            )
-        )
-        
-        data = []
-        
-        # 2. THE LOOP (Pure Python Math, No DB Queries)
-        for series in all_series:
-            total = series.total_tests_count
-            if total == 0: continue
-            
-            completed = series.completed_tests_count
-            progress = round((completed / total) * 100)
-            
-            data.append({
-                "id": series.id,
-                "name": series.name,
-                "category": series.category.name, # Already fetched via select_related
-                "progress": progress,
-                "icon": series.name[0]
-            })
-            
-        return Response(data)
+    def summary(self, request):
+        panels, timings = build_summary(request.user)
+        response = Response(panels)
+        if settings.DEBUG:
+            response['Server-Timing'] = server_timing(timings)
+        return response
     
\ No newline at end of file